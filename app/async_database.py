@@ -0,0 +1,154 @@
+import aiomysql
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from app.database import (
+    POOL_RECYCLE,
+    POOL_TIMEOUT,
+    PoolExhaustedError,
+    choose_replica,
+    connection_params,
+    open_replicas,
+    reading_from_replica,
+    replica_failed,
+    table_versions_query,
+)
+from app.formats import ResultSet
+from app.metrics import record_acquire, record_rows, record_statement
+
+ASYNC_POOL_MIN = int(os.getenv("DATABASE_ASYNC_POOL_MIN", "5"))
+ASYNC_POOL_MAX = int(os.getenv("DATABASE_ASYNC_POOL_MAX", "20"))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_replica_pools = {}
+_stats = {"checkouts": 0, "exhausted": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+
+async def _create_pool(**overrides):
+    params = connection_params(**overrides)
+    return await aiomysql.create_pool(
+        host=params["host"],
+        port=int(params["port"] or 3306),
+        user=params["user"],
+        password=params["password"],
+        db=params["database"],
+        minsize=ASYNC_POOL_MIN,
+        maxsize=ASYNC_POOL_MAX,
+        pool_recycle=int(POOL_RECYCLE) if POOL_RECYCLE else -1,
+        # The async path only serves reads, so every statement can commit on its own.
+        autocommit=True,
+    )
+
+
+async def open_async_pool():
+    global _pool
+    if _pool is None:
+        _pool = await _create_pool()
+        for replica in open_replicas():
+            try:
+                _replica_pools[replica.name] = await _create_pool(**replica.params)
+            except Exception as e:
+                logger.warning("Async reads will not use replica %s: %s", replica.name, e)
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    pool, _pool = _pool, None
+    pools = ([pool] if pool is not None else []) + list(_replica_pools.values())
+    _replica_pools.clear()
+    for pool in pools:
+        pool.close()
+        await pool.wait_closed()
+
+
+def async_pool_stats():
+    if _pool is None:
+        return None
+    checkouts = _stats["checkouts"]
+    return {
+        "size": _pool.size,
+        "min_size": _pool.minsize,
+        "max_size": _pool.maxsize,
+        "idle": _pool.freesize,
+        "in_use": _pool.size - _pool.freesize,
+        **_stats,
+        "wait_seconds_avg": _stats["wait_seconds_total"] / checkouts if checkouts else 0.0,
+    }
+
+
+async def _acquire_replica():
+    replica = choose_replica()
+    pool = _replica_pools.get(replica.name) if replica is not None else None
+    if pool is None:
+        return None, None
+    try:
+        conn = await asyncio.wait_for(pool.acquire(), POOL_TIMEOUT)
+    except Exception as e:
+        replica_failed(replica, e)
+        return None, None
+    replica.reads += 1
+    return pool, conn
+
+
+@asynccontextmanager
+async def async_db_connection(primary=False):
+    pool = await open_async_pool()
+    start = time.monotonic()
+    use_replica = reading_from_replica() and not primary
+    replica_pool, conn = await _acquire_replica() if use_replica else (None, None)
+    if replica_pool is not None:
+        pool = replica_pool
+    else:
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            _stats["exhausted"] += 1
+            raise PoolExhaustedError(f"No async database connection available after {POOL_TIMEOUT}s")
+
+    waited = time.monotonic() - start
+    _stats["checkouts"] += 1
+    _stats["wait_seconds_total"] += waited
+    _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+    record_acquire(waited)
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+async def _execute(cursor, query, params):
+    start = time.perf_counter()
+    try:
+        await cursor.execute(query, params)
+    finally:
+        record_statement(query, params, time.perf_counter() - start)
+
+
+async def fetch_all(query, params=None, primary=False):
+    async with async_db_connection(primary) as conn:
+        async with conn.cursor() as cursor:
+            await _execute(cursor, query, params)
+            start = time.perf_counter()
+            rows = await cursor.fetchall()
+            record_rows(len(rows), time.perf_counter() - start)
+            return ResultSet([column[0] for column in cursor.description], rows)
+
+
+async def fetch_one(query, params=None):
+    async with async_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            await _execute(cursor, query, params)
+            start = time.perf_counter()
+            row = await cursor.fetchone()
+            record_rows(0 if row is None else 1, time.perf_counter() - start)
+            return ResultSet([column[0] for column in cursor.description], [] if row is None else [row], one=True)
+
+
+async def fetch_table_versions(tables):
+    versions = dict((await fetch_all(*table_versions_query(tables), primary=True)).rows)
+    return [versions.get(table, 0) for table in tables]
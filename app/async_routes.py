@@ -0,0 +1,197 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.models import User, Fine, Publisher, Event, Book, Loan, EventRegistration
+from app.models import Page
+from app import queries
+from app.cache import cached
+from app.coalesce import coalesced
+from app.conditional import conditional
+from app.async_database import async_pool_stats, fetch_all, fetch_one
+from app.database import PoolExhaustedError
+from app.filters import filter_params
+from app.formats import negotiated
+from app.pagination import PageParams, build_page, page_query
+from datetime import date
+
+async_router = APIRouter()
+
+
+async def run_query(fetch, query, params=None):
+    try:
+        return await fetch(query, params)
+    except (HTTPException, PoolExhaustedError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def fetch_page_async(table, model, page, filters=()):
+    query, params = page_query(table, model, page, filters)
+    result = await run_query(fetch_all, query, params)
+    return build_page(model, result, page)
+
+
+@async_router.get("/users/", response_model=Page[User], response_model_exclude_unset=True)
+@conditional("users")
+async def list_users(page: PageParams = Depends(), filters: list = Depends(filter_params(User))):
+    return await fetch_page_async("users", User, page, filters)
+
+@async_router.get("/fines/", response_model=Page[Fine], response_model_exclude_unset=True)
+@conditional("fines")
+async def get_all_fines(page: PageParams = Depends(), filters: list = Depends(filter_params(Fine))):
+    return await fetch_page_async("fines", Fine, page, filters)
+
+@async_router.get("/publishers/", response_model=Page[Publisher], response_model_exclude_unset=True)
+@conditional("publishers")
+async def list_publishers(page: PageParams = Depends()):
+    return await fetch_page_async("publishers", Publisher, page)
+
+@async_router.get("/events/", response_model=Page[Event], response_model_exclude_unset=True)
+@conditional("events")
+async def list_events(page: PageParams = Depends(), filters: list = Depends(filter_params(Event))):
+    return await fetch_page_async("events", Event, page, filters)
+
+@async_router.get("/books/", response_model=Page[Book], response_model_exclude_unset=True)
+@conditional("books")
+async def list_books(page: PageParams = Depends(), filters: list = Depends(filter_params(Book))):
+    return await fetch_page_async("books", Book, page, filters)
+
+@async_router.get("/loans/", response_model=Page[Loan], response_model_exclude_unset=True)
+@conditional("loans")
+async def get_loans(page: PageParams = Depends(), filters: list = Depends(filter_params(Loan))):
+    return await fetch_page_async("loans", Loan, page, filters)
+
+@async_router.get("/event_registrations/", response_model=Page[EventRegistration], response_model_exclude_unset=True)
+@conditional("event_registrations")
+async def list_event_registrations(page: PageParams = Depends(), filters: list = Depends(filter_params(EventRegistration))):
+    return await fetch_page_async("event_registrations", EventRegistration, page, filters)
+
+
+@async_router.get("/users/fines_total")
+@conditional("users", "fines")
+@coalesced
+@negotiated
+@cached(tags=("users", "fines"), ttl=30)
+async def get_fines_total():
+    return await run_query(fetch_all, queries.FINES_TOTAL)
+
+
+@async_router.get("/fines/stats")
+@conditional("fines")
+@coalesced
+@negotiated
+@cached(tags=("fines",), ttl=30)
+async def get_fine_stats():
+    return await run_query(fetch_all, queries.FINE_STATS)
+
+
+@async_router.get("/loans/active")
+@conditional("users", "loans")
+@coalesced
+@negotiated
+async def get_active_loans():
+    return await run_query(fetch_all, queries.ACTIVE_LOANS)
+
+
+@async_router.get("/books/most_loaned")
+@conditional("books", "loans")
+@coalesced
+@negotiated
+@cached(tags=("books", "loans"), ttl=60)
+async def get_most_loaned_book():
+    return await run_query(fetch_one, queries.MOST_LOANED_BOOK)
+
+
+@async_router.get("/users/multiple_loans")
+@conditional("users", "loans")
+@coalesced
+@negotiated
+async def get_users_multiple_loans():
+    return await run_query(fetch_all, queries.USERS_MULTIPLE_LOANS)
+
+
+@async_router.get("/events/registrations_count")
+@conditional("users", "event_registrations")
+@coalesced
+@negotiated
+async def get_event_registrations_count():
+    return await run_query(fetch_all, queries.EVENT_REGISTRATIONS_COUNT)
+
+
+@async_router.get("/publishers/latest_books")
+@conditional("publishers", "books")
+@coalesced
+@negotiated
+async def get_latest_books_by_publisher():
+    return await run_query(fetch_all, queries.LATEST_BOOKS_BY_PUBLISHER)
+
+
+@async_router.get("/events/above_average_capacity")
+@conditional("events")
+@coalesced
+@negotiated
+async def get_events_above_avg_capacity():
+    return await run_query(fetch_all, queries.EVENTS_ABOVE_AVG_CAPACITY)
+
+
+@async_router.get("/users/loans_count")
+@conditional("users", "loans")
+@coalesced
+@negotiated
+@cached(tags=("users", "loans"), ttl=60)
+async def get_loans_per_user():
+    return await run_query(fetch_all, queries.LOANS_PER_USER)
+
+
+@async_router.get("/events/min_capacity")
+@conditional("events")
+@coalesced
+@negotiated
+async def get_min_capacity_event():
+    return await run_query(fetch_one, queries.MIN_CAPACITY_EVENT)
+
+
+@async_router.get("/users/no_fines")
+@conditional("users", "fines")
+@coalesced
+@negotiated
+async def get_users_without_fines():
+    return await run_query(fetch_all, queries.USERS_WITHOUT_FINES)
+
+
+@async_router.get("/books/category_count")
+@conditional("books")
+@coalesced
+@negotiated
+@cached(tags=("books",), ttl=300)
+async def get_book_count_by_category():
+    return await run_query(fetch_all, queries.BOOK_COUNT_BY_CATEGORY)
+
+
+@async_router.get("/loans/by_date")
+@conditional("users", "loans")
+@coalesced
+@negotiated
+async def get_loans_by_date(loan_date: date = Query(..., description="Fecha específica para buscar préstamos")):
+    return await run_query(fetch_all, queries.LOANS_BY_DATE, (loan_date,))
+
+
+@async_router.get("/events/type_count")
+@conditional("events")
+@coalesced
+@negotiated
+@cached(tags=("events",), ttl=300)
+async def get_event_count_by_type():
+    return await run_query(fetch_all, queries.EVENT_COUNT_BY_TYPE)
+
+
+@async_router.get("/loans/most_renewals")
+@conditional("users", "loans")
+@coalesced
+@negotiated
+async def get_user_with_most_renewals():
+    return await run_query(fetch_one, queries.USER_WITH_MOST_RENEWALS)
+
+
+@async_router.get("/pool/stats/async")
+async def get_async_pool_stats():
+    return async_pool_stats()
@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from typing import Optional
+from fastapi import Header, HTTPException, Query
+from app.cache import invalidate_tags
+from app.database import bump_table_versions, insert_many
+from app.ingest import check_references
+from app.serialization import dumps
+
+BULK_PARTIAL_CHUNK_SIZE = int(os.getenv("BULK_PARTIAL_CHUNK_SIZE", "500"))
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_LOCK_TIMEOUT = 10
+# Tries per chunk when InnoDB rolls back the whole transaction under it.
+BULK_CHUNK_ATTEMPTS = int(os.getenv("BULK_CHUNK_ATTEMPTS", "3"))
+
+# Deadlock, and lock wait timeout (which takes the whole transaction along when
+# innodb_rollback_on_timeout is on).
+ROLLBACK_ERRNOS = (1213, 1205)
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkRolledBack(Exception):
+    pass
+
+
+class IdempotencyKeyBusy(Exception):
+    pass
+
+
+def _rolled_back(error):
+    return isinstance(error, ChunkRolledBack) or getattr(error, "errno", None) in ROLLBACK_ERRNOS
+
+
+def fingerprint(item):
+    # Rows are matched by content, so a retry may resend the whole batch or only
+    # the rows that failed, in any order.
+    return hashlib.blake2b(dumps(item.model_dump(mode="json")), digest_size=16).digest()
+
+
+def _lock_name(kind, key):
+    # GET_LOCK names are limited to 64 characters.
+    return "bulk_" + hashlib.blake2b(f"{kind}:{key}".encode(), digest_size=16).hexdigest()
+
+
+def _created_earlier(cursor, kind, key, fingerprints):
+    wanted = sorted(set(fingerprints))
+    placeholders = ", ".join(["%s"] * len(wanted))
+    cursor.execute(
+        f"""
+        SELECT fingerprint, row_id FROM bulk_idempotency
+        WHERE idempotency_key = %s AND kind = %s AND fingerprint IN ({placeholders})
+        ORDER BY id
+        """,
+        (key, kind, *wanted),
+    )
+    created = {}
+    for digest, row_id in cursor.fetchall():
+        created.setdefault(bytes(digest), []).append(row_id)
+    return created
+
+
+def _rollback_to(cursor, savepoint, error):
+    if getattr(error, "errno", None) == 1213:
+        # A deadlock victim has no transaction left, so no savepoint either.
+        raise ChunkRolledBack(error) from error
+    try:
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+    except Exception:
+        # "SAVEPOINT does not exist": a lock wait timeout rolled everything back.
+        raise ChunkRolledBack(error) from error
+
+
+def _insert_isolated(cursor, importer, items, positions):
+    # The whole chunk first; only when MySQL rejects it are rows retried one by
+    # one, each under its own savepoint, to find the ones at fault.
+    rows = [tuple(getattr(item, column) for column in importer.columns) for item in items]
+    cursor.execute("SAVEPOINT bulk_chunk")
+    try:
+        ids = insert_many(cursor, importer.table, importer.columns, rows)
+        if importer.after_insert is not None and items:
+            importer.after_insert(cursor, items)
+        return list(zip(positions, ids)), []
+    except Exception as e:
+        _rollback_to(cursor, "bulk_chunk", e)
+
+    created, errors = [], []
+    for position, item, row in zip(positions, items, rows):
+        cursor.execute("SAVEPOINT bulk_row")
+        try:
+            [row_id] = insert_many(cursor, importer.table, importer.columns, [row])
+            if importer.after_insert is not None:
+                importer.after_insert(cursor, [item])
+            created.append((position, row_id))
+        except Exception as e:
+            _rollback_to(cursor, "bulk_row", e)
+            errors.append((position, str(e)))
+    return created, errors
+
+
+def _write_chunk(cursor, kind, importer, items, positions, idempotency_key, digests):
+    accepted, errors = check_references(cursor, importer, [items[position] for position in positions], positions)
+    failed = {position for position, _ in errors}
+    positions = [position for position in positions if position not in failed]
+    created, insert_errors = _insert_isolated(cursor, importer, accepted, positions)
+    if idempotency_key is not None and created:
+        insert_many(
+            cursor,
+            "bulk_idempotency",
+            ("idempotency_key", "kind", "fingerprint", "row_id"),
+            [(idempotency_key, kind, digests[position], row_id) for position, row_id in created],
+        )
+    return created, errors + insert_errors
+
+
+def write_partial(conn, cursor, kind, importer, items, idempotency_key=None, chunk_size=None):
+    # Commits the valid rows chunk by chunk and reports every index with its new
+    # id or error. With an idempotency key, rows created by an earlier request
+    # with the same key are answered with their ids instead of inserted again.
+    chunk_size = chunk_size or BULK_PARTIAL_CHUNK_SIZE
+    results = [{"index": index} for index in range(len(items))]
+    # Identical rows are matched to earlier ids in order, one id per occurrence,
+    # counting the ones this request creates itself.
+    claimed = defaultdict(int)
+
+    if idempotency_key is not None:
+        cursor.execute(
+            "DELETE FROM bulk_idempotency WHERE created_at < NOW() - INTERVAL %s HOUR LIMIT 1000",
+            (IDEMPOTENCY_TTL_HOURS,),
+        )
+        conn.commit()
+        # Serializes retries with the same key so a row is never created twice.
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (_lock_name(kind, idempotency_key), IDEMPOTENCY_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise IdempotencyKeyBusy("Another request with this Idempotency-Key is still running")
+
+    try:
+        for start in range(0, len(items), chunk_size):
+            positions = list(range(start, min(start + chunk_size, len(items))))
+            digests = {}
+            if idempotency_key is not None:
+                digests = {position: fingerprint(items[position]) for position in positions}
+                earlier = _created_earlier(cursor, kind, idempotency_key, digests.values())
+                for position in positions:
+                    digest = digests[position]
+                    ids = earlier.get(digest, [])
+                    if claimed[digest] < len(ids):
+                        results[position].update(id=ids[claimed[digest]], replayed=True)
+                        claimed[digest] += 1
+                positions = [position for position in positions if "id" not in results[position]]
+
+            for attempt in range(1, BULK_CHUNK_ATTEMPTS + 1):
+                try:
+                    created, errors = _write_chunk(cursor, kind, importer, items, positions, idempotency_key, digests)
+                    conn.commit()
+                    break
+                except Exception as e:
+                    if not _rolled_back(e):
+                        raise
+                    conn.rollback()
+                    if attempt == BULK_CHUNK_ATTEMPTS:
+                        # Nothing of this chunk was kept; the rows can be sent again.
+                        message = f"not written, transaction rolled back: {e}"
+                        created, errors = [], [(position, message) for position in positions]
+
+            for position, message in errors:
+                results[position]["error"] = message
+            for position, row_id in created:
+                results[position]["id"] = row_id
+                if idempotency_key is not None:
+                    claimed[digests[position]] += 1
+            if created:
+                bump_table_versions(conn, (importer.table,))
+                invalidate_tags(importer.table)
+                if importer.after_commit is not None:
+                    importer.after_commit()
+    finally:
+        if idempotency_key is not None:
+            try:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (_lock_name(kind, idempotency_key),))
+                cursor.fetchall()
+            except Exception as e:
+                # A broken connection is dropped by the pool, and the lock with it.
+                logger.warning("Could not release the Idempotency-Key lock: %s", e)
+
+    failed = sum(1 for result in results if "error" in result)
+    return {"created": len(results) - failed, "failed": failed, "results": results}
+
+
+class BulkOptions:
+    def __init__(
+        self,
+        atomic: bool = Query(True, description="false: commit valid rows in chunks and report every row"),
+        idempotency_key: Optional[str] = Header(
+            None, max_length=255, description="Retries with the same key skip rows already created (atomic=false)",
+        ),
+    ):
+        if idempotency_key is not None and atomic:
+            raise HTTPException(status_code=400, detail="Idempotency-Key requires atomic=false")
+        self.atomic = atomic
+        self.idempotency_key = idempotency_key
@@ -0,0 +1,373 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+import msgpack
+from app.database import reading_from_replica
+from app.formats import ResultSet
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "30"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# How long a process trusts the table versions it read from MySQL; a write made
+# through another worker shows up in this one's ETags within that time.
+TABLE_VERSIONS_TTL = float(os.getenv("TABLE_VERSIONS_TTL", "1"))
+
+_MISS = object()
+
+# Table versions @conditional read from MySQL for the current request; entries
+# are stamped with those when they cover the tags, so every process agrees.
+_request_versions = contextvars.ContextVar("request_table_versions", default=None)
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl, tags=()):
+        pass
+
+    @abstractmethod
+    def invalidate_tags(self, *tags):
+        pass
+
+    @abstractmethod
+    def bump_versions(self, *tags):
+        pass
+
+    @abstractmethod
+    def versions(self, tags):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def size(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        # Versions are per process and restart at zero; the epoch sets them apart
+        # from any other process's counts.
+        self._epoch = uuid.uuid4().hex
+        self._versions = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            expires_at, value, tags = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return _MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def bump_versions(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def versions(self, tags):
+        with self._lock:
+            return self._epoch, [self._versions.get(tag, 0) for tag in tags]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Extension codes for the types cached results hold beyond plain msgpack ones.
+_EXT_DATE, _EXT_DATETIME, _EXT_DECIMAL, _EXT_RESULT_SET = 1, 2, 3, 4
+
+
+def _pack_default(value):
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(_EXT_DATE, value.isoformat().encode())
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode())
+    if isinstance(value, ResultSet):
+        return msgpack.ExtType(_EXT_RESULT_SET, _pack([value.columns, value.rows, value.one]))
+    raise TypeError(f"Object of type {type(value).__name__} cannot be cached in Redis")
+
+
+def _ext_hook(code, data):
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_RESULT_SET:
+        columns, rows, one = _unpack(data)
+        return ResultSet(list(columns), list(rows), one)
+    return msgpack.ExtType(code, data)
+
+
+def _pack(value):
+    return msgpack.packb(value, default=_pack_default)
+
+
+def _unpack(payload):
+    # Arrays come back as tuples so entry stamps compare equal to fresh ones.
+    return msgpack.unpackb(payload, ext_hook=_ext_hook, use_list=False)
+
+
+# Shared backend for multi-worker deployments; needs the optional `redis` package.
+# Entries are msgpack, never pickle: whoever can write to the Redis instance must
+# not be able to run code in the API by planting an entry.
+class RedisCache(CacheBackend):
+    def __init__(self, url, prefix="library-cache"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def _key(self, key):
+        return f"{self._prefix}:entry:{key}"
+
+    def _tag(self, tag):
+        return f"{self._prefix}:tag:{tag}"
+
+    def _version(self, tag):
+        return f"{self._prefix}:version:{tag}"
+
+    def get(self, key):
+        payload = self._client.get(self._key(key))
+        return _MISS if payload is None else _unpack(payload)
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self._client.pipeline()
+        pipe.set(self._key(key), _pack(value), px=int(ttl * 1000))
+        for tag in tags:
+            pipe.sadd(self._tag(tag), self._key(key))
+        pipe.execute()
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            keys = self._client.smembers(self._tag(tag))
+            pipe = self._client.pipeline()
+            if keys:
+                pipe.delete(*keys)
+            pipe.delete(self._tag(tag))
+            pipe.execute()
+
+    def bump_versions(self, *tags):
+        pipe = self._client.pipeline()
+        for tag in tags:
+            pipe.incr(self._version(tag))
+        pipe.execute()
+
+    def versions(self, tags):
+        # A flushed Redis restarts the counters, so it also gets a new epoch.
+        epoch_key = f"{self._prefix}:epoch"
+        pipe = self._client.pipeline()
+        pipe.set(epoch_key, uuid.uuid4().hex, nx=True)
+        pipe.mget([epoch_key] + [self._version(tag) for tag in tags])
+        epoch, *versions = pipe.execute()[1]
+        return epoch.decode(), [int(version or 0) for version in versions]
+
+    def clear(self):
+        keys = list(self._client.scan_iter(f"{self._prefix}:*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def size(self):
+        return sum(1 for _ in self._client.scan_iter(self._key("*")))
+
+
+class VersionCache:
+    # Table versions read from MySQL, kept per process for a short TTL so most
+    # conditional GETs, 304s included, are answered without a query.
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._generation = 0
+
+    def get(self, tables):
+        # Returns the versions, or None and a generation to hand back to put().
+        now = time.monotonic()
+        with self._lock:
+            entries = [self._versions.get(table) for table in tables]
+            if all(entry is not None and entry[0] > now for entry in entries):
+                return [entry[1] for entry in entries], None
+            return None, self._generation
+
+    def put(self, tables, versions, generation):
+        with self._lock:
+            # A local write forgot versions while these were being read, so they
+            # may predate it.
+            if generation != self._generation:
+                return
+            expires_at = time.monotonic() + self.ttl
+            for table, version in zip(tables, versions):
+                self._versions[table] = (expires_at, version)
+
+    def forget(self, tables):
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                self._versions.pop(table, None)
+
+
+def _create_backend():
+    if CACHE_BACKEND == "redis":
+        return RedisCache(CACHE_REDIS_URL)
+    return MemoryCache(CACHE_MAX_ENTRIES)
+
+
+backend = _create_backend()
+known_versions = VersionCache(TABLE_VERSIONS_TTL)
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(name, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+
+def invalidate_tags(*tags):
+    # Tags are table names, so this is also where a table's change version moves.
+    # Called after database.bump_table_versions, so the next conditional GET in
+    # this process reads the new versions and its own writes show up at once.
+    backend.invalidate_tags(*tags)
+    backend.bump_versions(*tags)
+    known_versions.forget(tags)
+
+
+def cache_stats():
+    with _stats_lock:
+        endpoints = {name: dict(counters) for name, counters in _stats.items()}
+    return {
+        "backend": type(backend).__name__,
+        "entries": backend.size(),
+        "hits": sum(counters["hits"] for counters in endpoints.values()),
+        "misses": sum(counters["misses"] for counters in endpoints.values()),
+        "endpoints": endpoints,
+    }
+
+
+def _make_key(name, kwargs):
+    return name + repr(sorted(kwargs.items()))
+
+
+def use_versions(versions):
+    return _request_versions.set(versions)
+
+
+def reset_versions(token):
+    _request_versions.reset(token)
+
+
+def _stamp(tags):
+    known = _request_versions.get()
+    if known is not None and all(tag in known for tag in tags):
+        return "db", tuple(known[tag] for tag in tags)
+    epoch, versions = backend.versions(tags)
+    return epoch, tuple(versions)
+
+
+def _store(key, stamp, value, ttl, tags):
+    # A lagging replica can return rows older than the versions in the stamp,
+    # and the entry would be served as current until its TTL ran out.
+    if reading_from_replica():
+        return
+    backend.set(key, (stamp, value), ttl, tags)
+
+
+def cached(tags, ttl=None):
+    # Keyed on the function name, so the sync and async versions of a route share
+    # entries. CACHE_TTL_<FUNCTION_NAME> overrides the TTL of a single endpoint.
+    # Entries are stamped with the tag versions read before the query ran; a write
+    # that commits while it runs moves them on, so a result that may predate the
+    # write is never served, whichever of the two finishes first.
+    def decorator(func):
+        name = func.__name__
+        default_ttl = CACHE_DEFAULT_TTL if ttl is None else ttl
+        entry_ttl = float(os.getenv(f"CACHE_TTL_{name.upper()}", default_ttl))
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(**kwargs):
+                key = _make_key(name, kwargs)
+                stamp = _stamp(tags)
+                entry = backend.get(key)
+                if entry is not _MISS and entry[0] == stamp:
+                    _count(name, "hits")
+                    return entry[1]
+                _count(name, "misses")
+                value = await func(**kwargs)
+                _store(key, stamp, value, entry_ttl, tags)
+                return value
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            key = _make_key(name, kwargs)
+            stamp = _stamp(tags)
+            entry = backend.get(key)
+            if entry is not _MISS and entry[0] == stamp:
+                _count(name, "hits")
+                return entry[1]
+            _count(name, "misses")
+            value = func(**kwargs)
+            _store(key, stamp, value, entry_ttl, tags)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,120 @@
+import asyncio
+import functools
+import threading
+from fastapi.responses import Response
+
+_lock = threading.Lock()
+_flights = {}
+_async_flights = {}
+_stats = {}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _make_key(name, kwargs):
+    return name + repr(sorted(kwargs.items()))
+
+
+def _count(name, outcome):
+    with _lock:
+        counters = _stats.setdefault(name, {"executions": 0, "coalesced": 0})
+        counters[outcome] += 1
+
+
+def _share(result):
+    # Every request gets its own Response, since later decorators and middleware
+    # set headers on it, but all of them send the leader's body bytes.
+    if not isinstance(result, Response):
+        return result
+    headers = {key: value for key, value in result.headers.items() if key != "content-length"}
+    return Response(result.body, status_code=result.status_code, headers=headers)
+
+
+def coalesced(func):
+    # Goes between @conditional and @negotiated. Concurrent calls with the same
+    # arguments (query parameters and wire format) wait for the one already
+    # running and reuse its rendered body instead of running the query again.
+    # Nothing is kept once that call returns; @cached is the layer that stores.
+    name = func.__name__
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(**kwargs):
+            key = _make_key(name, kwargs)
+            while key in _async_flights:
+                future = _async_flights[key]
+                _count(name, "coalesced")
+                try:
+                    return _share(await asyncio.shield(future))
+                except asyncio.CancelledError:
+                    # The leader's client went away; run it again unless we were cancelled too.
+                    if not future.cancelled():
+                        raise
+
+            future = asyncio.get_running_loop().create_future()
+            _async_flights[key] = future
+            _count(name, "executions")
+            try:
+                result = await func(**kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Marks the exception retrieved when nobody was waiting for it.
+                future.exception()
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                del _async_flights[key]
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(**kwargs):
+        key = _make_key(name, kwargs)
+        with _lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight()
+        if not leader:
+            # Waits in its threadpool thread; the pooled connection stays free.
+            _count(name, "coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _share(flight.result)
+
+        _count(name, "executions")
+        try:
+            flight.result = func(**kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with _lock:
+                del _flights[key]
+            flight.done.set()
+
+    return wrapper
+
+
+def coalesce_stats():
+    with _lock:
+        endpoints = {name: dict(counters) for name, counters in _stats.items()}
+        in_flight = len(_flights) + len(_async_flights)
+    return {
+        "in_flight": in_flight,
+        "executions": sum(counters["executions"] for counters in endpoints.values()),
+        "coalesced": sum(counters["coalesced"] for counters in endpoints.values()),
+        "endpoints": endpoints,
+    }
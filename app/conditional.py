@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+from fastapi import Request
+from fastapi.responses import Response
+from app.cache import known_versions, reset_versions, use_versions
+from app.database import PoolExhaustedError, get_pool, read_table_versions, reading_from_replica
+from app.schema import MIGRATIONS
+
+ENCODING_SUFFIXES = ("-gzip", "-br")
+# Responses change shape with the schema, so tags from before a migration never match.
+SCHEMA_VERSION = str(MIGRATIONS[-1][0])
+
+logger = logging.getLogger(__name__)
+
+
+def encoded_etag(etag, encoding):
+    # A compressed body is a different representation, so it gets its own strong tag.
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _strip_encoding(etag):
+    for suffix in ENCODING_SUFFIXES:
+        if etag.endswith(suffix + '"'):
+            return etag[:-len(suffix) - 1] + '"'
+    return etag
+
+
+def table_versions(tables):
+    # Read on the primary, since writers bump these rows there, but at most once
+    # per TABLE_VERSIONS_TTL per process; the rest come from memory.
+    versions, generation = known_versions.get(tables)
+    if versions is not None:
+        return versions
+    try:
+        conn = get_pool().acquire()
+        cursor = conn.cursor(prepared=True)
+        try:
+            versions = read_table_versions(cursor, tables)
+        finally:
+            cursor.close()
+            conn.close()
+    except PoolExhaustedError:
+        raise
+    except Exception as e:
+        # E.g. before migration 9; the route still answers, just without a tag.
+        logger.warning("Could not read table versions: %s", e)
+        return None
+    known_versions.put(tables, versions, generation)
+    return versions
+
+
+async def table_versions_async(tables):
+    from app.async_database import fetch_table_versions
+
+    versions, generation = known_versions.get(tables)
+    if versions is not None:
+        return versions
+    try:
+        versions = await fetch_table_versions(tables)
+    except PoolExhaustedError:
+        raise
+    except Exception as e:
+        logger.warning("Could not read table versions: %s", e)
+        return None
+    known_versions.put(tables, versions, generation)
+    return versions
+
+
+def compute_etag(request, tables, versions):
+    parts = [SCHEMA_VERSION, *(f"{table}={version}" for table, version in zip(tables, versions))]
+    # The same table versions render differently per path, query string and format.
+    parts += [request.url.path, request.url.query, request.headers.get("accept", "")]
+    return '"' + hashlib.blake2b("|".join(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def not_modified(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison.
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if _strip_encoding(candidate) == etag:
+            return True
+    return False
+
+
+def _headers(etag):
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+
+def _finish(result, etag, response):
+    # A lagging replica can return rows older than the versions the tag was built
+    # from, so only primary reads hand out tags; 304s stay safe either way.
+    if reading_from_replica():
+        return result
+    target = result if isinstance(result, Response) else response
+    target.headers.update(_headers(etag))
+    return result
+
+
+def conditional(*tables):
+    # Goes right below @router.get. The ETag comes from the change versions of the
+    # tables the route reads, kept in MySQL (table_versions) and bumped right
+    # after every write commits, so all workers agree on them. Each process reads
+    # them at most once per TABLE_VERSIONS_TTL, so a matching If-None-Match is
+    # usually answered without touching MySQL; a write through another worker
+    # can take up to that long to change the tag here. Writes that bypass the API
+    # must bump table_versions themselves (see database.bump_table_versions), or
+    # clients keep getting 304s until the next API write to that table.
+    def decorator(func):
+        signature = inspect.signature(func)
+        parameters = list(signature.parameters.values()) + [
+            inspect.Parameter("conditional_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            inspect.Parameter("conditional_response", inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ]
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(conditional_request, conditional_response, **kwargs):
+                versions = await table_versions_async(tables)
+                if versions is None:
+                    return await func(**kwargs)
+                etag = compute_etag(conditional_request, tables, versions)
+                if not_modified(conditional_request, etag):
+                    return Response(status_code=304, headers=_headers(etag))
+                # @cached below stamps its entries with the same versions.
+                token = use_versions(dict(zip(tables, versions)))
+                try:
+                    return _finish(await func(**kwargs), etag, conditional_response)
+                finally:
+                    reset_versions(token)
+
+            async_wrapper.__signature__ = signature.replace(parameters=parameters)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(conditional_request, conditional_response, **kwargs):
+            versions = table_versions(tables)
+            if versions is None:
+                return func(**kwargs)
+            etag = compute_etag(conditional_request, tables, versions)
+            if not_modified(conditional_request, etag):
+                return Response(status_code=304, headers=_headers(etag))
+            token = use_versions(dict(zip(tables, versions)))
+            try:
+                return _finish(func(**kwargs), etag, conditional_response)
+            finally:
+                reset_versions(token)
+
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,69 @@
+import csv
+import io
+import os
+from typing import Literal
+from fastapi.responses import StreamingResponse
+from app.database import get_db_connection
+from app.pagination import select_columns
+from app.serialization import dumps
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _ndjson_chunk(columns, rows):
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _close(cursor, conn):
+    try:
+        cursor.close()
+    except Exception:
+        # Closing an unbuffered cursor mid-stream can complain about unread rows;
+        # the pool discards the connection in that case.
+        pass
+    conn.close()
+
+
+def stream_table(table, model, format, fields=None):
+    columns = select_columns(model, fields)
+
+    conn = get_db_connection()
+    # Unbuffered: rows stay on the socket until fetchmany pulls the next chunk.
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+    except Exception:
+        _close(cursor, conn)
+        raise
+
+    def generate():
+        try:
+            if format == "csv":
+                yield _csv_chunk([columns])
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                yield _csv_chunk(rows) if format == "csv" else _ndjson_chunk(columns, rows)
+        finally:
+            _close(cursor, conn)
+
+    extension = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+    )
@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import inspect
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Literal, Optional
+import msgpack
+from fastapi import Depends, Query, Request
+from fastapi.responses import Response
+from app.metrics import timed_serialization
+from app.serialization import FastJSONResponse
+
+WireFormat = Literal["json", "columnar", "msgpack"]
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.library.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/vnd.library.columnar+msgpack"
+
+ACCEPTED_MEDIA_TYPES = {
+    "application/json": "json",
+    COLUMNAR_MEDIA_TYPE: "columnar",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+
+
+class ResultSet:
+    def __init__(self, columns, rows, one=False):
+        self.columns = columns
+        self.rows = rows
+        # Single-row routes answer with one object (or null) in the json format.
+        self.one = one
+
+    def records(self):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+def result_set(cursor, one=False):
+    columns = [column[0] for column in cursor.description]
+    if one:
+        row = cursor.fetchone()
+        return ResultSet(columns, [] if row is None else [row], one=True)
+    return ResultSet(columns, cursor.fetchall())
+
+
+def negotiate(
+    request: Request,
+    format: Optional[WireFormat] = Query(None, description="Response format; overrides the Accept header"),
+):
+    if format is not None:
+        return format
+    for media_range in request.headers.get("accept", "").split(","):
+        wire_format = ACCEPTED_MEDIA_TYPES.get(media_range.split(";")[0].strip().lower())
+        if wire_format is not None:
+            return wire_format
+    return "json"
+
+
+def _msgpack_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def render(result, wire_format, **extra):
+    with timed_serialization():
+        return _render(result, wire_format, extra)
+
+
+def _render(result, wire_format, extra):
+    # The body depends on the Accept header, so shared caches must key on it too.
+    headers = {"Vary": "Accept"}
+    if wire_format == "json":
+        records = result.records()
+        if result.one:
+            return FastJSONResponse(records[0] if records else None, headers=headers)
+        return FastJSONResponse({"items": records, **extra} if extra else records, headers=headers)
+
+    document = {"columns": result.columns, "rows": result.rows, **extra}
+    if wire_format == "msgpack":
+        return Response(
+            msgpack.packb(document, default=_msgpack_default),
+            media_type=MSGPACK_MEDIA_TYPE,
+            headers=headers,
+        )
+    return FastJSONResponse(document, media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
+
+
+def negotiated(func):
+    # Goes between @router.get and @cached: the cache keeps the ResultSet and every
+    # format is rendered from it, so json, columnar and msgpack share one entry.
+    signature = inspect.signature(func)
+    parameters = list(signature.parameters.values()) + [
+        inspect.Parameter("wire_format", inspect.Parameter.KEYWORD_ONLY, default=Depends(negotiate))
+    ]
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(wire_format, **kwargs):
+            return render(await func(**kwargs), wire_format)
+
+        async_wrapper.__signature__ = signature.replace(parameters=parameters)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(wire_format, **kwargs):
+        return render(func(**kwargs), wire_format)
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
@@ -0,0 +1,298 @@
+import codecs
+import csv
+import json
+import os
+import tempfile
+from typing import Literal, get_args
+import anyio
+from pydantic import ValidationError
+from app.cache import invalidate_tags
+from app.database import PoolExhaustedError, bump_table_versions, find_missing_ids, get_db_connection, insert_many
+from app.leaderboards import refresh_leaderboards
+from app.models import BookCreate, EventCreate, FineCreate, LoanCreate, PublisherCreate, UserCreate
+from app.summaries import record_fine_rows, record_loans
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "2000"))
+UPLOAD_MAX_ERRORS = int(os.getenv("UPLOAD_MAX_ERRORS", "100"))
+# Body chunks buffered between the socket and the parser thread.
+UPLOAD_BUFFER_CHUNKS = int(os.getenv("UPLOAD_BUFFER_CHUNKS", "16"))
+
+UploadFormat = Literal["csv", "ndjson"]
+UploadMethod = Literal["insert", "load_data"]
+
+UPLOAD_MEDIA_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class Importer:
+    def __init__(self, table, model, columns, references=None, after_insert=None, after_commit=None):
+        self.table = table
+        self.model = model
+        self.columns = columns
+        # field -> referenced table; rows pointing at missing ids are rejected one by one.
+        self.references = references or {}
+        self.after_insert = after_insert
+        # Called with no arguments once a chunk with inserted rows is committed.
+        self.after_commit = after_commit
+
+
+IMPORTERS = {
+    "users": Importer(
+        "users", UserCreate, ("name", "address", "phone", "email", "registration_date", "user_type"),
+    ),
+    "publishers": Importer("publishers", PublisherCreate, ("publisher_name", "country", "foundation_year")),
+    "events": Importer(
+        "events", EventCreate, ("event_name", "description", "event_date", "event_type", "capacity"),
+    ),
+    "fines": Importer(
+        "fines",
+        FineCreate,
+        ("user_id", "reason", "start_date", "end_date", "amount"),
+        references={"user_id": "users"},
+        after_insert=record_fine_rows,
+    ),
+    "books": Importer(
+        "books",
+        BookCreate,
+        ("title", "author", "category", "publication_year", "status", "type", "publisher_id"),
+        references={"publisher_id": "publishers"},
+    ),
+    "loans": Importer(
+        "loans",
+        LoanCreate,
+        ("book_id", "user_id", "loan_date", "return_date", "renewals", "status", "librarian_id"),
+        references={"user_id": "users", "book_id": "books"},
+        after_insert=record_loans,
+        after_commit=refresh_leaderboards,
+    ),
+}
+
+
+def check_references(cursor, importer, items, positions):
+    missing = {
+        field: set(find_missing_ids(cursor, table, [getattr(item, field) for item in items]))
+        for field, table in importer.references.items()
+    }
+    accepted, errors = [], []
+    for position, item in zip(positions, items):
+        problems = [
+            f"{field} {getattr(item, field)} not found" for field, ids in missing.items() if getattr(item, field) in ids
+        ]
+        if problems:
+            errors.append((position, "; ".join(problems)))
+        else:
+            accepted.append(item)
+    return accepted, errors
+
+
+def write_chunk(cursor, importer, items, positions):
+    # Returns (inserted ids, [(position, message)]) for one chunk; the caller commits.
+    accepted, errors = check_references(cursor, importer, items, positions)
+    rows = [tuple(getattr(item, column) for column in importer.columns) for item in accepted]
+    ids = insert_many(cursor, importer.table, importer.columns, rows)
+    if importer.after_insert is not None and accepted:
+        importer.after_insert(cursor, accepted)
+    return ids, errors
+
+
+def load_chunk(cursor, importer, items, positions):
+    # LOAD DATA LOCAL INFILE from a temp file holding only this chunk, so disk use
+    # is bounded too. It reports no ids, only the number of rows loaded.
+    accepted, errors = check_references(cursor, importer, items, positions)
+    if not accepted:
+        return 0, errors
+    with tempfile.NamedTemporaryFile("w", newline="", encoding="utf-8", suffix=".csv") as handle:
+        writer = csv.writer(handle, lineterminator="\n")
+        writer.writerows(tuple(getattr(item, column) for column in importer.columns) for item in accepted)
+        handle.flush()
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {importer.table} CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' ({', '.join(importer.columns)})",
+            (handle.name,),
+        )
+    if importer.after_insert is not None:
+        importer.after_insert(cursor, accepted)
+    return len(accepted), errors
+
+
+def _lines(chunks):
+    # Splits a stream of byte chunks into text lines, keeping the newline so the
+    # csv module can still join quoted fields that span lines.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _ndjson_records(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def _nullable_fields(model):
+    return {name for name, field in model.model_fields.items() if type(None) in get_args(field.annotation)}
+
+
+def _csv_records(lines, nullable=()):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        # line_num is the physical line the record ends on; the header is line 1.
+        if None in record:
+            yield reader.line_num, None, "more values than header columns"
+            continue
+        # CSV has no null: an empty cell is None where the field allows it, and
+        # otherwise goes to validation as the empty string it is.
+        yield reader.line_num, {
+            key: None if value == "" and key in nullable else value for key, value in record.items()
+        }, None
+
+
+def _describe(error):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+    )
+
+
+class UploadReport:
+    def __init__(self):
+        self.rows_received = 0
+        self.rows_inserted = 0
+        self.rows_failed = 0
+        self.errors = []
+
+    def fail(self, errors):
+        self.rows_failed += len(errors)
+        room = UPLOAD_MAX_ERRORS - len(self.errors)
+        self.errors.extend({"line": line, "error": message} for line, message in errors[:max(room, 0)])
+
+    def as_dict(self):
+        return {
+            "rows_received": self.rows_received,
+            "rows_inserted": self.rows_inserted,
+            "rows_failed": self.rows_failed,
+            "errors": self.errors,
+            "errors_truncated": self.rows_failed > len(self.errors),
+        }
+
+
+def import_stream(kind, format, method, chunks, chunk_size=None):
+    importer = IMPORTERS[kind]
+    write = load_chunk if method == "load_data" else write_chunk
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    if format == "csv":
+        records = _csv_records(_lines(chunks), _nullable_fields(importer.model))
+    else:
+        records = _ndjson_records(_lines(chunks))
+    report = UploadReport()
+    items, positions = [], []
+
+    def flush():
+        conn = cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            result, errors = write(cursor, importer, items, positions)
+            conn.commit()
+            if result:
+                bump_table_versions(conn, (importer.table,))
+        except PoolExhaustedError:
+            # Not the chunk's fault; the whole upload answers 503 and can be retried.
+            raise
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            result, errors = 0, [(line, f"chunk not written: {e}") for line in positions]
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if conn is not None:
+                conn.close()
+        inserted = result if isinstance(result, int) else len(result)
+        if inserted:
+            invalidate_tags(importer.table)
+            if importer.after_commit is not None:
+                importer.after_commit()
+        report.rows_inserted += inserted
+        report.fail(errors)
+        items.clear()
+        positions.clear()
+
+    try:
+        for line, record, problem in records:
+            report.rows_received += 1
+            if problem is None:
+                try:
+                    items.append(importer.model.model_validate(record))
+                    positions.append(line)
+                except ValidationError as e:
+                    problem = _describe(e)
+            if problem is not None:
+                report.fail([(line, problem)])
+            if len(items) >= chunk_size:
+                flush()
+        if items:
+            flush()
+    finally:
+        # Stops the body reader if parsing ended early.
+        chunks.close()
+    return report.as_dict()
+
+
+async def receive_upload(request, kind, format, method):
+    # The socket is read on the event loop and parsed, validated and written in a
+    # worker thread; the bounded stream between them keeps memory flat.
+    send, receive = anyio.create_memory_object_stream(UPLOAD_BUFFER_CHUNKS)
+
+    def body_chunks():
+        try:
+            while True:
+                try:
+                    yield anyio.from_thread.run(receive.receive)
+                except anyio.EndOfStream:
+                    return
+        finally:
+            anyio.from_thread.run_sync(receive.close)
+
+    report = None
+
+    async def consume():
+        nonlocal report
+        report = await anyio.to_thread.run_sync(import_stream, kind, format, method, body_chunks())
+
+    try:
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(consume)
+            async with send:
+                async for chunk in request.stream():
+                    if not chunk:
+                        continue
+                    try:
+                        await send.send(chunk)
+                    except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+                        break
+    except* PoolExhaustedError as group:
+        # The task group wraps it; the app's handler turns the bare error into a 503.
+        raise group.exceptions[0] from None
+    return report
@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.cache import invalidate_tags
+from app.database import bump_table_versions, get_db_connection
+from app.ingest import IMPORTERS, write_chunk
+
+JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+JOB_CHUNK_SIZE = int(os.getenv("INGEST_JOB_CHUNK_SIZE", "5000"))
+JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+JOB_MAX_ERRORS = int(os.getenv("INGEST_JOB_MAX_ERRORS", "100"))
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, kind, items, chunk_size):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.items = items
+        self.chunk_size = chunk_size
+        self.total = len(items)
+        self.status = "queued"
+        self.rows_done = 0
+        self.rows_failed = 0
+        self.chunks_done = 0
+        self.errors = []
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record_chunk(self, inserted, errors):
+        with self._lock:
+            self.rows_done += inserted
+            self.rows_failed += len(errors)
+            self.chunks_done += 1
+            room = JOB_MAX_ERRORS - len(self.errors)
+            self.errors.extend({"index": index, "error": message} for index, message in errors[:max(room, 0)])
+
+    def snapshot(self):
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0.0
+            throughput = self.rows_done / elapsed if elapsed > 0 else None
+            remaining = self.total - self.rows_done - self.rows_failed
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "total": self.total,
+                "rows_done": self.rows_done,
+                "rows_failed": self.rows_failed,
+                "chunks_done": self.chunks_done,
+                "chunk_size": self.chunk_size,
+                "throughput_rows_per_second": round(throughput, 1) if throughput else None,
+                "eta_seconds": round(remaining / throughput, 1) if throughput and self.status == "running" else None,
+                "elapsed_seconds": round(elapsed, 3),
+                "errors": list(self.errors),
+                "errors_truncated": self.rows_failed > len(self.errors),
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_executor = None
+_stopping = threading.Event()
+
+
+def _get_executor():
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ingest")
+        return _executor
+
+
+def _run(job):
+    importer = IMPORTERS[job.kind]
+    job.status = "running"
+    job.started_at = time.time()
+    try:
+        for offset in range(0, job.total, job.chunk_size):
+            if _stopping.is_set():
+                # Shutdown: chunks already committed stay, the rest is not imported.
+                job.status = "interrupted"
+                return
+            chunk = job.items[offset:offset + job.chunk_size]
+            # One short transaction per chunk; the connection goes back to the pool
+            # in between so API requests are never starved by a long import.
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                ids, errors = write_chunk(cursor, importer, chunk, range(offset, offset + len(chunk)))
+                conn.commit()
+                if ids:
+                    bump_table_versions(conn, (importer.table,))
+            except Exception as e:
+                conn.rollback()
+                logger.warning("Job %s chunk at %d failed: %s", job.id, offset, e)
+                ids, errors = [], [(index, str(e)) for index in range(offset, offset + len(chunk))]
+            finally:
+                cursor.close()
+                conn.close()
+
+            if ids:
+                invalidate_tags(importer.table)
+                if importer.after_commit is not None:
+                    importer.after_commit()
+            job.record_chunk(len(ids), errors)
+        job.status = "completed" if job.rows_failed == 0 else "completed_with_errors"
+    except Exception as e:
+        logger.exception("Job %s failed", job.id)
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        # Validated rows are only needed while the job runs.
+        job.items = None
+
+
+def submit_job(kind, items, chunk_size=None):
+    job = Job(kind, items, chunk_size or JOB_CHUNK_SIZE)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        # Finished jobs beyond the history limit are forgotten, oldest first.
+        for job_id in list(_jobs):
+            if len(_jobs) <= JOB_HISTORY:
+                break
+            if _jobs[job_id].finished_at is not None:
+                del _jobs[job_id]
+    _get_executor().submit(_run, job)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs():
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [job.snapshot() for job in reversed(jobs)]
+
+
+def shutdown_jobs():
+    global _executor
+    with _jobs_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        # Running jobs stop after their current chunk; queued ones never start.
+        _stopping.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        _stopping.clear()
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Literal
+from app import queries
+from app.database import get_db_connection
+from app.formats import ResultSet
+
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+# Rows loaded per window beyond the largest page served, so entries climbing from
+# just below the cut are already known with their name and exact score.
+LEADERBOARD_DEPTH = 2 * LEADERBOARD_SIZE
+LEADERBOARD_RECONCILE_INTERVAL = float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "60"))
+
+LeaderboardWindow = Literal["all", "30d", "7d"]
+WINDOWS = {"all": None, "30d": 30, "7d": 7}
+
+logger = logging.getLogger(__name__)
+
+
+def window_start(window, today):
+    days = WINDOWS[window]
+    return None if days is None else today - timedelta(days=days - 1)
+
+
+class Leaderboard:
+    # Each window is a snapshot of the top LEADERBOARD_DEPTH rows from MySQL plus
+    # the scores added by loans recorded since. Windows only shed old loans on
+    # reconciliation, so a 7-day board can include a day too many until then.
+    def __init__(self, columns, all_time_query, since_query, key, weight):
+        self.columns = columns
+        self.all_time_query = all_time_query
+        self.since_query = since_query
+        self.key = key
+        self.weight = weight
+        self.reconciled_on = None
+        self._lock = threading.Lock()
+        self._snapshots = {window: {} for window in WINDOWS}
+        self._deltas = {window: defaultdict(int) for window in WINDOWS}
+        # Per window, how much an entry below the snapshot must gain to reach the
+        # board; None when the snapshot holds every entry with a score.
+        self._gaps = {window: None for window in WINDOWS}
+        self._ranked = {}
+
+    def reconcile(self, cursor, today):
+        # Deltas start over before the queries run; a loan committed in between is
+        # counted twice until the next reconciliation, never lost.
+        with self._lock:
+            self._deltas = {window: defaultdict(int) for window in WINDOWS}
+        snapshots, gaps = {}, {}
+        for window in WINDOWS:
+            start = window_start(window, today)
+            if start is None:
+                cursor.execute(self.all_time_query, (LEADERBOARD_DEPTH,))
+            else:
+                cursor.execute(self.since_query, (start, LEADERBOARD_DEPTH))
+            rows = cursor.fetchall()
+            snapshots[window] = {key: (label, int(score)) for key, label, score in rows}
+            full = len(rows) >= LEADERBOARD_DEPTH
+            gaps[window] = int(rows[LEADERBOARD_SIZE - 1][2]) - int(rows[-1][2]) if full else None
+        with self._lock:
+            self._snapshots = snapshots
+            self._gaps = gaps
+            self._ranked = {}
+            self.reconciled_on = today
+
+    def record(self, loans, today):
+        # Returns True when an entry missing from the snapshot may have entered the
+        # board, so its name and full score should be loaded soon. With no gap the
+        # snapshot held every scored entry, so a missing one is new and on it.
+        outsider = False
+        with self._lock:
+            for loan in loans:
+                weight = self.weight(loan)
+                if not weight:
+                    continue
+                key = self.key(loan)
+                for window in WINDOWS:
+                    start = window_start(window, today)
+                    if start is not None and loan.loan_date < start:
+                        continue
+                    self._deltas[window][key] += weight
+                    if key not in self._snapshots[window]:
+                        gap = self._gaps[window]
+                        outsider = outsider or gap is None or self._deltas[window][key] >= gap
+            self._ranked = {}
+        return outsider
+
+    def top(self, window, n):
+        with self._lock:
+            ranked = self._ranked.get(window)
+            if ranked is None:
+                snapshot = self._snapshots[window]
+                scores = {key: score for key, (_, score) in snapshot.items()}
+                for key, delta in self._deltas[window].items():
+                    scores[key] = scores.get(key, 0) + delta
+                order = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:LEADERBOARD_SIZE]
+                ranked = [(key, snapshot.get(key, (None, 0))[0], score) for key, score in order]
+                self._ranked[window] = ranked
+        return ResultSet(list(self.columns), ranked[:n])
+
+
+BOARDS = {
+    "books": Leaderboard(
+        ("book_id", "title", "loan_count"),
+        queries.TOP_BOOKS_ALL_TIME,
+        queries.TOP_BOOKS_SINCE,
+        key=lambda loan: loan.book_id,
+        weight=lambda loan: 1,
+    ),
+    "renewals": Leaderboard(
+        ("user_id", "name", "total_renewals"),
+        queries.TOP_RENEWALS_ALL_TIME,
+        queries.TOP_RENEWALS_SINCE,
+        key=lambda loan: loan.user_id,
+        weight=lambda loan: loan.renewals,
+    ),
+}
+
+_wake = threading.Event()
+_stop = threading.Event()
+_reconcile_lock = threading.Lock()
+_thread = None
+
+
+def reconcile_leaderboards():
+    with _reconcile_lock:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        try:
+            today = date.today()
+            for board in BOARDS.values():
+                board.reconcile(cursor, today)
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def _reconcile_loop():
+    while not _stop.is_set():
+        try:
+            reconcile_leaderboards()
+        except Exception as e:
+            logger.warning("Leaderboard reconciliation failed: %s", e)
+        _wake.wait(LEADERBOARD_RECONCILE_INTERVAL)
+        _wake.clear()
+
+
+def start_leaderboards():
+    global _thread
+    _stop.clear()
+    _thread = threading.Thread(target=_reconcile_loop, name="leaderboards", daemon=True)
+    _thread.start()
+
+
+def stop_leaderboards():
+    global _thread
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join()
+        _thread = None
+
+
+def record_loans(loans):
+    # Call after the loans are committed.
+    today = date.today()
+    outsiders = [board.record(loans, today) for board in BOARDS.values()]
+    if any(outsiders):
+        _wake.set()
+
+
+def refresh_leaderboards():
+    # For bulk imports: one early reconciliation beats replaying every row.
+    _wake.set()
+
+
+def top(name, window, n):
+    board = BOARDS[name]
+    if board.reconciled_on is None:
+        # Nothing loaded yet, e.g. a request racing startup.
+        reconcile_leaderboards()
+    return board.top(window, n)
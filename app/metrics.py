@@ -0,0 +1,293 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.acquire_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.statuses = {}
+        self.statements = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.acquire_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.app_seconds = 0.0
+
+
+_lock = threading.Lock()
+_routes = {}
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token, method, route, status, stats, seconds):
+    _current.reset(token)
+    with _lock:
+        metrics = _routes.get((method, route))
+        if metrics is None:
+            metrics = _routes[(method, route)] = RouteMetrics()
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                metrics.buckets[i] += 1
+        metrics.count += 1
+        metrics.seconds += seconds
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.statements += stats.statements
+        metrics.rows += stats.rows
+        metrics.db_seconds += stats.db_seconds
+        metrics.acquire_seconds += stats.acquire_seconds
+        metrics.serialize_seconds += stats.serialize_seconds
+        metrics.app_seconds += max(
+            seconds - stats.db_seconds - stats.acquire_seconds - stats.serialize_seconds, 0.0
+        )
+
+
+def record_acquire(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.acquire_seconds += seconds
+
+
+@contextmanager
+def timed_serialization():
+    # Building a body often goes through render() and then a response's own
+    # render(); only the outermost step is timed so nothing is counted twice.
+    stats = _current.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        stats.serialize_seconds += time.perf_counter() - start
+
+
+def record_rows(count, seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += count
+        stats.db_seconds += seconds
+
+
+def record_statement(operation, params, seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning(
+            "slow query (%.1f ms): %s params=%s",
+            seconds * 1000,
+            " ".join(str(operation).split()),
+            redact(params),
+        )
+
+
+def _redact_value(value):
+    # Ids, counts and amounts are kept; free text (names, emails, phones,
+    # addresses) and dates are masked.
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value
+    if isinstance(value, (date, datetime)):
+        return "<date>"
+    return f"<{type(value).__name__}:{len(str(value))}>"
+
+
+def redact(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    return [_redact_value(value) for value in params]
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            record_statement(operation, params, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            record_statement(operation, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        record_rows(0 if row is None else 1, time.perf_counter() - start)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        record_rows(len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        record_rows(len(rows), time.perf_counter() - start)
+        return rows
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats, token = start_request()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by route template, not raw path, to keep label cardinality bounded.
+            path = getattr(route, "path", None) or "unmatched"
+            end_request(token, scope["method"], path, status, stats, time.perf_counter() - start)
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _metric(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{labels} {value}")
+
+
+def render(pool=None, cache=None, coalescing=None):
+    with _lock:
+        routes = sorted(_routes.items())
+        lines = []
+
+        lines.append("# HELP http_request_duration_seconds Request latency by route.")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (method, route), metrics in routes:
+            for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                lines.append(
+                    f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {count}"
+                )
+            lines.append(
+                f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {metrics.count}"
+            )
+            lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {metrics.seconds}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {metrics.count}")
+
+        _metric(lines, "http_requests_total", "counter", "Requests by route and status.", [
+            (_labels(method=method, route=route, status=status), count)
+            for (method, route), metrics in routes
+            for status, count in sorted(metrics.statuses.items())
+        ])
+        per_route = [
+            ("db_statements_total", "counter", "SQL statements executed.", "statements"),
+            ("db_rows_fetched_total", "counter", "Rows fetched from MySQL.", "rows"),
+            ("db_time_seconds_total", "counter", "Time spent executing SQL and fetching rows.", "db_seconds"),
+            ("db_acquire_seconds_total", "counter", "Time spent waiting for a pooled connection.", "acquire_seconds"),
+            ("serialize_time_seconds_total", "counter",
+             "Time building response bodies: row mapping, model construction and JSON/msgpack encoding.",
+             "serialize_seconds"),
+            ("app_time_seconds_total", "counter",
+             "Remaining time: request parsing, response_model validation, routing and framework overhead.",
+             "app_seconds"),
+        ]
+        for name, kind, help_text, attribute in per_route:
+            _metric(lines, name, kind, help_text, [
+                (_labels(method=method, route=route), getattr(metrics, attribute))
+                for (method, route), metrics in routes
+            ])
+
+    if pool is not None:
+        _metric(lines, "db_pool_in_use", "gauge", "Connections checked out.", [("", pool["in_use"])])
+        _metric(lines, "db_pool_idle", "gauge", "Idle pooled connections.", [("", pool["idle"])])
+        _metric(lines, "db_pool_opened", "gauge", "Open pooled connections.", [("", pool["opened"])])
+        _metric(lines, "db_pool_checkouts_total", "counter", "Connection checkouts.", [("", pool["checkouts"])])
+        _metric(lines, "db_pool_exhausted_total", "counter", "Checkouts that timed out.", [("", pool["exhausted"])])
+        _metric(lines, "db_pool_wait_seconds_total", "counter", "Total checkout wait.",
+                [("", pool["wait_seconds_total"])])
+        statements = pool["statement_cache"]
+        _metric(lines, "db_statement_cache_prepared", "gauge", "Prepared statements held by pooled connections.",
+                [("", statements["prepared"])])
+        _metric(lines, "db_statement_cache_hits_total", "counter", "Statements run without preparing them again.",
+                [("", statements["hits"])])
+        _metric(lines, "db_statement_cache_misses_total", "counter", "Statements prepared on a connection.",
+                [("", statements["misses"])])
+        _metric(lines, "db_statement_cache_evictions_total", "counter", "Prepared statements closed to make room.",
+                [("", statements["evictions"])])
+
+    if cache is not None:
+        _metric(lines, "cache_hits_total", "counter", "Result cache hits.", [
+            (_labels(endpoint=name), counters["hits"]) for name, counters in sorted(cache["endpoints"].items())
+        ])
+        _metric(lines, "cache_misses_total", "counter", "Result cache misses.", [
+            (_labels(endpoint=name), counters["misses"]) for name, counters in sorted(cache["endpoints"].items())
+        ])
+
+    if coalescing is not None:
+        endpoints = sorted(coalescing["endpoints"].items())
+        _metric(lines, "coalesce_executions_total", "counter", "Read handler runs that led a flight.", [
+            (_labels(endpoint=name), counters["executions"]) for name, counters in endpoints
+        ])
+        _metric(lines, "coalesce_joined_total", "counter", "Requests served by joining an identical in-flight read.", [
+            (_labels(endpoint=name), counters["coalesced"]) for name, counters in endpoints
+        ])
+
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import date
+from typing import ClassVar, Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Filter operators the list routes accept per field (see app/filters.py). Only
+# indexed columns are listed so every filter stays an index lookup or range.
+EQUALITY = ("eq", "in")
+RANGE = ("eq", "gt", "gte", "lt", "lte")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
 
 class UserBase(BaseModel):
     name: str
@@ -15,8 +27,9 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    filters: ClassVar[Dict[str, Tuple[str, ...]]] = {"registration_date": RANGE}
+
+    model_config = ConfigDict(from_attributes=True)
 class FineCreate(BaseModel):
     user_id: int
     reason: str
@@ -28,6 +41,8 @@ class Fine(FineCreate):
     id: int
     user_id: int
 
+    filters: ClassVar[Dict[str, Tuple[str, ...]]] = {"user_id": EQUALITY, "start_date": RANGE}
+
 class PublisherBase(BaseModel):
     publisher_name: str
     country: str
@@ -39,8 +54,7 @@ class PublisherCreate(PublisherBase):
 class Publisher(PublisherBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class EventBase(BaseModel):
     event_name: str
@@ -54,9 +68,12 @@ class EventCreate(EventBase):
 
 class Event(EventBase):
     id: int
+    # Maintained by the registration routes; never set by clients.
+    registered_count: int = 0
+
+    filters: ClassVar[Dict[str, Tuple[str, ...]]] = {"event_date": RANGE, "event_type": EQUALITY, "capacity": RANGE}
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class BookBase(BaseModel):
     title: str
@@ -73,8 +90,12 @@ class BookCreate(BookBase):
 class Book(BookBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    filters: ClassVar[Dict[str, Tuple[str, ...]]] = {"publisher_id": EQUALITY, "category": EQUALITY}
+
+    model_config = ConfigDict(from_attributes=True)
+
+class BookSearchHit(Book):
+    relevance: float
 
 class LoanBase(BaseModel):
     book_id: int
@@ -91,8 +112,15 @@ class LoanCreate(LoanBase):
 class Loan(LoanBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    filters: ClassVar[Dict[str, Tuple[str, ...]]] = {
+        "user_id": EQUALITY,
+        "book_id": EQUALITY,
+        "status": EQUALITY,
+        "loan_date": RANGE,
+        "return_date": RANGE,
+    }
+
+    model_config = ConfigDict(from_attributes=True)
 
 class EventRegistrationCreate(BaseModel):
     event_id: int
@@ -102,5 +130,28 @@ class EventRegistrationCreate(BaseModel):
 class EventRegistration(EventRegistrationCreate):
     id: int
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    filters: ClassVar[Dict[str, Tuple[str, ...]]] = {"event_id": EQUALITY, "user_id": EQUALITY}
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RegistrationRejection(BaseModel):
+    index: int
+    event_id: int
+    user_id: int
+    reason: str
+
+class RegistrationBatch(BaseModel):
+    registered: List[EventRegistration]
+    rejected: List[RegistrationRejection]
+
+class BulkRowResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+    # True when the row was created by an earlier request with the same Idempotency-Key.
+    replayed: bool = False
+
+class BulkResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkRowResult]
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import json
+import os
+from typing import Optional
+from fastapi import Depends, HTTPException, Query
+from app.filters import where_clause
+from app.formats import WireFormat, negotiate, render, result_set
+from app.metrics import timed_serialization
+from app.serialization import VALIDATE_RESPONSES
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+
+def encode_cursor(last_id):
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return 0
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return last_id
+
+
+def select_columns(model, fields):
+    columns = list(model.model_fields)
+    if not fields:
+        return columns
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # The primary key is always returned because the next cursor is built from it.
+    return ["id"] + [column for column in columns if column in requested and column != "id"]
+
+
+class PageParams:
+    def __init__(
+        self,
+        after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+        wire_format: WireFormat = Depends(negotiate),
+    ):
+        self.after = after
+        self.limit = limit
+        self.fields = fields
+        self.wire_format = wire_format
+
+
+def page_query(table, model, page, filters=()):
+    columns = select_columns(model, page.fields)
+    conditions, params = where_clause(filters)
+    where = " AND ".join(["id > %s"] + conditions)
+    query = f"SELECT {', '.join(columns)} FROM {table} WHERE {where} ORDER BY id LIMIT %s"
+    # One extra row tells us whether another page exists.
+    return query, (decode_cursor(page.after), *params, page.limit + 1)
+
+
+def build_page(model, result, page, cursor_for=None):
+    next_cursor = None
+    if len(result.rows) > page.limit:
+        result.rows = result.rows[:page.limit]
+        if cursor_for is not None:
+            next_cursor = cursor_for(result)
+        else:
+            next_cursor = encode_cursor(result.rows[-1][result.columns.index("id")])
+
+    if page.wire_format != "json" or not VALIDATE_RESPONSES:
+        # Trusted DB rows: tuples straight to the encoder, no model instances.
+        return render(result, page.wire_format, next_cursor=next_cursor)
+    with timed_serialization():
+        rows = result.records()
+        if page.fields:
+            # Projected rows lack required fields; build them unvalidated and let
+            # response_model_exclude_unset drop the columns that were not selected.
+            rows = [model.model_construct(**row) for row in rows]
+    # Plain dicts are validated once, by FastAPI against the response_model.
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def fetch_page(cursor, table, model, page, filters=()):
+    cursor.execute(*page_query(table, model, page, filters))
+    return build_page(model, result_set(cursor), page)
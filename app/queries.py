@@ -0,0 +1,137 @@
+FINES_TOTAL = """
+SELECT u.id, u.name, s.total_amount AS total_fines
+FROM users u
+LEFT JOIN user_fine_summary s ON u.id = s.user_id
+"""
+
+# AVG(amount) over DECIMAL(10, 2) gave DECIMAL(14, 6); the cast keeps that type.
+FINE_STATS = """
+SELECT user_id, max_amount AS max_fine, min_amount AS min_fine,
+       CAST(total_amount / fine_count AS DECIMAL(14, 6)) AS avg_fine
+FROM user_fine_summary
+"""
+
+ACTIVE_LOANS = """
+SELECT u.id AS user_id, u.name, l.id AS loan_id, l.loan_date, l.return_date
+FROM users u
+INNER JOIN loans l ON u.id = l.user_id
+WHERE l.status = 'active'
+"""
+
+MOST_LOANED_BOOK = """
+SELECT b.title, s.loan_count
+FROM book_loan_summary s
+INNER JOIN books b ON b.id = s.book_id
+ORDER BY s.loan_count DESC
+LIMIT 1
+"""
+
+USERS_MULTIPLE_LOANS = """
+SELECT u.id, u.name, s.loan_count
+FROM user_loan_summary s
+INNER JOIN users u ON u.id = s.user_id
+WHERE s.loan_count > 5
+"""
+
+EVENT_REGISTRATIONS_COUNT = """
+SELECT u.id, u.name, COALESCE(s.registration_count, 0) AS registration_count
+FROM users u
+LEFT JOIN user_registration_summary s ON u.id = s.user_id
+"""
+
+LATEST_BOOKS_BY_PUBLISHER = """
+SELECT p.publisher_name, b.title, MAX(b.publication_year) AS latest_year
+FROM publishers p
+INNER JOIN books b ON p.id = b.publisher_id
+GROUP BY p.id
+"""
+
+EVENTS_ABOVE_AVG_CAPACITY = """
+SELECT event_name, capacity
+FROM events
+WHERE capacity > (SELECT AVG(capacity) FROM events)
+"""
+
+LOANS_PER_USER = """
+SELECT u.name, CAST(COALESCE(SUM(s.loan_count), 0) AS UNSIGNED) AS loan_count
+FROM users u
+LEFT JOIN user_loan_summary s ON u.id = s.user_id
+GROUP BY u.name
+"""
+
+MIN_CAPACITY_EVENT = """
+SELECT event_name, MIN(capacity) AS min_capacity
+FROM events
+"""
+
+USERS_WITHOUT_FINES = """
+SELECT u.id, u.name
+FROM users u
+LEFT JOIN fines f ON u.id = f.user_id
+WHERE f.id IS NULL
+"""
+
+BOOK_COUNT_BY_CATEGORY = """
+SELECT category, COUNT(id) AS book_count
+FROM books
+GROUP BY category
+"""
+
+LOANS_BY_DATE = """
+SELECT u.id, u.name, l.id AS loan_id, l.loan_date
+FROM users u
+INNER JOIN loans l ON u.id = l.user_id
+WHERE l.loan_date = %s
+"""
+
+EVENT_COUNT_BY_TYPE = """
+SELECT event_type, COUNT(id) AS event_count
+FROM events
+GROUP BY event_type
+"""
+
+USER_WITH_MOST_RENEWALS = """
+SELECT u.id, u.name, s.total_renewals
+FROM user_loan_summary s
+INNER JOIN users u ON u.id = s.user_id
+ORDER BY s.total_renewals DESC
+LIMIT 1
+"""
+
+# Leaderboard reconciliation: the top rows per window, deeper than any page served.
+TOP_BOOKS_ALL_TIME = """
+SELECT s.book_id, b.title, s.loan_count
+FROM book_loan_summary s
+INNER JOIN books b ON b.id = s.book_id
+ORDER BY s.loan_count DESC, s.book_id
+LIMIT %s
+"""
+
+TOP_BOOKS_SINCE = """
+SELECT l.book_id, b.title, COUNT(*) AS loan_count
+FROM loans l
+INNER JOIN books b ON b.id = l.book_id
+WHERE l.loan_date >= %s
+GROUP BY l.book_id, b.title
+ORDER BY loan_count DESC, l.book_id
+LIMIT %s
+"""
+
+TOP_RENEWALS_ALL_TIME = """
+SELECT s.user_id, u.name, s.total_renewals
+FROM user_loan_summary s
+INNER JOIN users u ON u.id = s.user_id
+WHERE s.total_renewals > 0
+ORDER BY s.total_renewals DESC, s.user_id
+LIMIT %s
+"""
+
+TOP_RENEWALS_SINCE = """
+SELECT l.user_id, u.name, SUM(l.renewals) AS total_renewals
+FROM loans l
+INNER JOIN users u ON u.id = l.user_id
+WHERE l.loan_date >= %s AND l.renewals > 0
+GROUP BY l.user_id, u.name
+ORDER BY total_renewals DESC, l.user_id
+LIMIT %s
+"""
@@ -0,0 +1,35 @@
+from typing import Literal
+
+RegistrationMode = Literal["all", "partial"]
+
+# Seats are taken with one conditional UPDATE per event instead of counting
+# registrations, so a full event is rejected without reading event_registrations
+# and the row lock is held only until the batch commits.
+RESERVE_SEATS_ALL = """
+UPDATE events
+SET registered_count = registered_count + %s
+WHERE id = %s AND registered_count + %s <= capacity
+"""
+
+# Takes as many of the requested seats as are left. LAST_INSERT_ID(expr) hands the
+# number granted back in the OK packet, so no SELECT is needed afterwards.
+RESERVE_SEATS_PARTIAL = """
+UPDATE events
+SET registered_count = registered_count + LAST_INSERT_ID(LEAST(%s, capacity - registered_count))
+WHERE id = %s AND registered_count < capacity
+"""
+
+
+def reserve_seats(cursor, requested, mode):
+    # requested: {event_id: seats}. Returns {event_id: seats granted}; with mode
+    # "all" an event gets every seat it asked for or none. Events are updated in
+    # id order so concurrent batches lock rows in the same order.
+    granted = {}
+    for event_id, seats in sorted(requested.items()):
+        if mode == "all":
+            cursor.execute(RESERVE_SEATS_ALL, (seats, event_id, seats))
+            granted[event_id] = seats if cursor.rowcount == 1 else 0
+        else:
+            cursor.execute(RESERVE_SEATS_PARTIAL, (seats, event_id))
+            granted[event_id] = cursor.lastrowid if cursor.rowcount == 1 else 0
+    return granted
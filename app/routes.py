@@ -1,37 +1,86 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse
 from app.models import UserCreate, User
 from app.models import FineCreate, Fine
 from app.models import Publisher, PublisherCreate
 from app.models import Event, EventCreate
-from app.models import BookCreate, Book
+from app.models import BookCreate, Book, BookSearchHit
 from app.models import Loan, LoanCreate
-from app.models import EventRegistration, EventRegistrationCreate
-from app.database import get_db_connection
-from typing import List
+from app.models import EventRegistration, EventRegistrationCreate, RegistrationBatch, RegistrationRejection
+from app.models import BulkResult, Page
+from app import queries
+from app.bulk import BulkOptions, IdempotencyKeyBusy, write_partial
+from app.cache import cache_stats, cached, invalidate_tags
+from app.coalesce import coalesce_stats, coalesced
+from app.conditional import conditional
+from app import leaderboards, metrics
+from app.database import LOCAL_INFILE, bump_table_versions, get_db_connection, find_missing_ids, insert_many
+from app.database import pool_stats, replica_stats
+from app.export import ExportFormat, stream_table
+from app.filters import filter_params
+from app.formats import negotiated, result_set
+from app.ingest import IMPORTERS, UPLOAD_MEDIA_TYPES, UploadFormat, UploadMethod, receive_upload
+from app.jobs import get_job, list_jobs, submit_job
+from app.leaderboards import LEADERBOARD_SIZE, LeaderboardWindow
+from app.pagination import PageParams, fetch_page
+from app.registrations import RegistrationMode, reserve_seats
+from app.search import SearchParams, search_books
+from app.summaries import TIMESERIES_MAX_DAYS, Granularity, TimeseriesSplit, loan_timeseries_query
+from app.summaries import record_fines, record_loans, record_registrations
+from pydantic import TypeAdapter, ValidationError
+from collections import Counter
+from typing import List, Optional, Union
 from datetime import date
 
 router = APIRouter()
 
-@router.post("/users/", response_model=List[User])
-def create_users_bulk(users: List[UserCreate]):
+
+def raise_if_missing(missing):
+    missing = {table: ids for table, ids in missing.items() if ids}
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Referenced records not found", "missing": missing})
+
+
+def _create_partial(kind, items, idempotency_key):
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        created_users = []
-        for user in users:
-            query = """
-            INSERT INTO users (name, address, phone, email, registration_date, user_type)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            values = (user.name, user.address, user.phone, user.email, user.registration_date, user.user_type)
+        return write_partial(conn, cursor, kind, IMPORTERS[kind], items, idempotency_key)
+    except IdempotencyKeyBusy as e:
+        # Nothing was written; the same request can be sent again once the other one ends.
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.post("/users/", response_model=Union[List[User], BulkResult])
+def create_users_bulk(users: List[UserCreate], bulk: BulkOptions = Depends()):
+    if not bulk.atomic:
+        return _create_partial("users", users, bulk.idempotency_key)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(prepared=True)
 
-            cursor.execute(query, values)
-            user_id = cursor.lastrowid
-            created_users.append(User(id=user_id, **user.dict()))
+    try:
+        rows = [
+            (user.name, user.address, user.phone, user.email, user.registration_date, user.user_type)
+            for user in users
+        ]
+        user_ids = insert_many(
+            cursor, "users", ("name", "address", "phone", "email", "registration_date", "user_type"), rows
+        )
 
         conn.commit()
-        return created_users
+        bump_table_versions(conn, ("users",))
+        invalidate_tags("users")
+        return [User(id=user_id, **user.model_dump()) for user_id, user in zip(user_ids, users)]
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -39,48 +88,58 @@ def create_users_bulk(users: List[UserCreate]):
         cursor.close()
         conn.close()
 
-@router.get("/users/", response_model=List[User])
-def list_users():
+@router.get("/users/", response_model=Page[User], response_model_exclude_unset=True)
+@conditional("users")
+def list_users(page: PageParams = Depends(), filters: list = Depends(filter_params(User))):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     try:
-        query = "SELECT * FROM users"
-        cursor.execute(query)
-        users = cursor.fetchall()
-        return [User(**user) for user in users]
+        return fetch_page(cursor, "users", User, page, filters)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
         conn.close()
 
-@router.post("/users/{user_id}/fines/", response_model=List[Fine])
-def create_fines_bulk(user_id: int, fines: List[FineCreate]):
+@router.get("/users/export")
+@conditional("users")
+def export_users(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("users", User, format, fields)
+
+@router.post("/users/{user_id}/fines/", response_model=Union[List[Fine], BulkResult])
+def create_fines_bulk(user_id: int, fines: List[FineCreate], bulk: BulkOptions = Depends()):
+    if not bulk.atomic:
+        fines = [fine.model_copy(update={"user_id": user_id}) for fine in fines]
+        return _create_partial("fines", fines, bulk.idempotency_key)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(prepared=True)
     
     try:
         cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        created_fines = []
-        for fine in fines:
-            query = """
-            INSERT INTO fines (user_id, reason, start_date, end_date, amount)
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            values = (user_id, fine.reason, fine.start_date, fine.end_date, fine.amount)
-            
-            cursor.execute(query, values)
-            fine_id = cursor.lastrowid
-            
-            fine_data = fine.dict(exclude={"user_id"})
-            created_fines.append(Fine(id=fine_id, user_id=user_id, **fine_data))
-        
+        rows = [(user_id, fine.reason, fine.start_date, fine.end_date, fine.amount) for fine in fines]
+        fine_ids = insert_many(cursor, "fines", ("user_id", "reason", "start_date", "end_date", "amount"), rows)
+        record_fines(cursor, user_id, [fine.amount for fine in fines])
+
         conn.commit()
-        return created_fines
+        bump_table_versions(conn, ("fines",))
+        invalidate_tags("fines")
+        return [
+            Fine(id=fine_id, user_id=user_id, **fine.model_dump(exclude={"user_id"}))
+            for fine_id, fine in zip(fine_ids, fines)
+        ]
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -88,42 +147,49 @@ def create_fines_bulk(user_id: int, fines: List[FineCreate]):
         cursor.close()
         conn.close()
 
-@router.get("/fines/", response_model=List[Fine])
-def get_all_fines():
+@router.get("/fines/", response_model=Page[Fine], response_model_exclude_unset=True)
+@conditional("fines")
+def get_all_fines(page: PageParams = Depends(), filters: list = Depends(filter_params(Fine))):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
+    cursor = conn.cursor()
+
     try:
-        cursor.execute("SELECT * FROM fines")
-        fines = cursor.fetchall()
-        
-        return [Fine(**fine) for fine in fines]
+        return fetch_page(cursor, "fines", Fine, page, filters)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
         conn.close()
 
-@router.post("/publishers/", response_model=List[Publisher])
-def create_publishers_bulk(publishers: List[PublisherCreate]):
+@router.get("/fines/export")
+@conditional("fines")
+def export_fines(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("fines", Fine, format, fields)
+
+@router.post("/publishers/", response_model=Union[List[Publisher], BulkResult])
+def create_publishers_bulk(publishers: List[PublisherCreate], bulk: BulkOptions = Depends()):
+    if not bulk.atomic:
+        return _create_partial("publishers", publishers, bulk.idempotency_key)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(prepared=True)
     
     try:
-        created_publishers = []
-        for publisher in publishers:
-            query = """
-            INSERT INTO publishers (publisher_name, country, foundation_year)
-            VALUES (%s, %s, %s)
-            """
-            values = (publisher.publisher_name, publisher.country, publisher.foundation_year)
-            
-            cursor.execute(query, values)
-            publisher_id = cursor.lastrowid
-            created_publishers.append(Publisher(id=publisher_id, **publisher.dict()))
-        
+        rows = [(publisher.publisher_name, publisher.country, publisher.foundation_year) for publisher in publishers]
+        publisher_ids = insert_many(cursor, "publishers", ("publisher_name", "country", "foundation_year"), rows)
+
         conn.commit()
-        return created_publishers
+        bump_table_versions(conn, ("publishers",))
+        invalidate_tags("publishers")
+        return [
+            Publisher(id=publisher_id, **publisher.model_dump())
+            for publisher_id, publisher in zip(publisher_ids, publishers)
+        ]
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -131,42 +197,51 @@ def create_publishers_bulk(publishers: List[PublisherCreate]):
         cursor.close()
         conn.close()
 
-@router.get("/publishers/", response_model=List[Publisher])
-def list_publishers():
+@router.get("/publishers/", response_model=Page[Publisher], response_model_exclude_unset=True)
+@conditional("publishers")
+def list_publishers(page: PageParams = Depends()):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
+    cursor = conn.cursor()
+
     try:
-        query = "SELECT * FROM publishers"
-        cursor.execute(query)
-        publishers = cursor.fetchall()
-        return [Publisher(**publisher) for publisher in publishers]
+        return fetch_page(cursor, "publishers", Publisher, page)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
         conn.close()
 
-@router.post("/events/", response_model=List[Event])
-def create_events_bulk(events: List[EventCreate]):
+@router.get("/publishers/export")
+@conditional("publishers")
+def export_publishers(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("publishers", Publisher, format, fields)
+
+@router.post("/events/", response_model=Union[List[Event], BulkResult])
+def create_events_bulk(events: List[EventCreate], bulk: BulkOptions = Depends()):
+    if not bulk.atomic:
+        return _create_partial("events", events, bulk.idempotency_key)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(prepared=True)
     
     try:
-        created_events = []
-        for event in events:
-            query = """
-            INSERT INTO events (event_name, description, event_date, event_type, capacity)
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            values = (event.event_name, event.description, event.event_date, event.event_type, event.capacity)
-            
-            cursor.execute(query, values)
-            event_id = cursor.lastrowid
-            created_events.append(Event(id=event_id, **event.dict()))
-        
+        rows = [
+            (event.event_name, event.description, event.event_date, event.event_type, event.capacity)
+            for event in events
+        ]
+        event_ids = insert_many(
+            cursor, "events", ("event_name", "description", "event_date", "event_type", "capacity"), rows
+        )
+
         conn.commit()
-        return created_events
+        bump_table_versions(conn, ("events",))
+        invalidate_tags("events")
+        return [Event(id=event_id, **event.model_dump()) for event_id, event in zip(event_ids, events)]
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -174,45 +249,61 @@ def create_events_bulk(events: List[EventCreate]):
         cursor.close()
         conn.close()
 
-@router.get("/events/", response_model=List[Event])
-def list_events():
+@router.get("/events/", response_model=Page[Event], response_model_exclude_unset=True)
+@conditional("events")
+def list_events(page: PageParams = Depends(), filters: list = Depends(filter_params(Event))):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
+    cursor = conn.cursor()
+
     try:
-        query = "SELECT * FROM events"
-        cursor.execute(query)
-        events = cursor.fetchall()
-        return [Event(**event) for event in events]
+        return fetch_page(cursor, "events", Event, page, filters)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
         conn.close()
 
-@router.post("/books/", response_model=List[Book])
-def create_books_bulk(books: List[BookCreate]):
+@router.get("/events/export")
+@conditional("events")
+def export_events(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("events", Event, format, fields)
+
+@router.post("/books/", response_model=Union[List[Book], BulkResult])
+def create_books_bulk(books: List[BookCreate], bulk: BulkOptions = Depends()):
+    if not bulk.atomic:
+        return _create_partial("books", books, bulk.idempotency_key)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(prepared=True)
 
     try:
-        created_books = []
-        for book in books:
-            cursor.execute("SELECT id FROM publishers WHERE id = %s", (book.publisher_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"Publisher with id {book.publisher_id} not found")
-
-            query = """
-            INSERT INTO books (title, author, category, publication_year, status, type, publisher_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            values = (book.title, book.author, book.category, book.publication_year, book.status, book.type, book.publisher_id)
-            cursor.execute(query, values)
-            book_id = cursor.lastrowid
-            created_books.append(Book(id=book_id, **book.dict()))
+        raise_if_missing({
+            "publishers": find_missing_ids(cursor, "publishers", [book.publisher_id for book in books]),
+        })
+
+        rows = [
+            (book.title, book.author, book.category, book.publication_year, book.status, book.type, book.publisher_id)
+            for book in books
+        ]
+        book_ids = insert_many(
+            cursor,
+            "books",
+            ("title", "author", "category", "publication_year", "status", "type", "publisher_id"),
+            rows,
+        )
 
         conn.commit()
-        return created_books
+        bump_table_versions(conn, ("books",))
+        invalidate_tags("books")
+        return [Book(id=book_id, **book.model_dump()) for book_id, book in zip(book_ids, books)]
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -220,48 +311,80 @@ def create_books_bulk(books: List[BookCreate]):
         cursor.close()
         conn.close()
 
-@router.get("/books/", response_model=List[Book])
-def list_books():
+@router.get("/books/", response_model=Page[Book], response_model_exclude_unset=True)
+@conditional("books")
+def list_books(page: PageParams = Depends(), filters: list = Depends(filter_params(Book))):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT * FROM books")
-        books = cursor.fetchall()
-        return [Book(**book) for book in books]
+        return fetch_page(cursor, "books", Book, page, filters)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
         conn.close()
 
-@router.post("/loans/", response_model=List[Loan])
-def create_loans_bulk(loans: List[LoanCreate]):
+@router.get("/books/search", response_model=Page[BookSearchHit], response_model_exclude_unset=True)
+@conditional("books")
+def search_books_route(params: SearchParams = Depends()):
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        created_loans = []
-        for loan in loans:
-            cursor.execute("SELECT id FROM users WHERE id = %s", (loan.user_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"User with id {loan.user_id} not found")
+        return search_books(cursor, params)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
 
-            cursor.execute("SELECT id FROM books WHERE id = %s", (loan.book_id,))
-            if not cursor.fetchone():
-                raise HTTPException(status_code=404, detail=f"Book with id {loan.book_id} not found")
+@router.get("/books/export")
+@conditional("books")
+def export_books(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("books", Book, format, fields)
 
-            query = """
-            INSERT INTO loans (book_id, user_id, loan_date, return_date, renewals, status, librarian_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            values = (loan.book_id, loan.user_id, loan.loan_date, loan.return_date, loan.renewals, loan.status, loan.librarian_id)
-            cursor.execute(query, values)
-            loan_id = cursor.lastrowid
-            created_loans.append(Loan(id=loan_id, **loan.dict()))
+@router.post("/loans/", response_model=Union[List[Loan], BulkResult])
+def create_loans_bulk(loans: List[LoanCreate], bulk: BulkOptions = Depends()):
+    if not bulk.atomic:
+        return _create_partial("loans", loans, bulk.idempotency_key)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(prepared=True)
+
+    try:
+        raise_if_missing({
+            "users": find_missing_ids(cursor, "users", [loan.user_id for loan in loans]),
+            "books": find_missing_ids(cursor, "books", [loan.book_id for loan in loans]),
+        })
+
+        rows = [
+            (loan.book_id, loan.user_id, loan.loan_date, loan.return_date, loan.renewals, loan.status, loan.librarian_id)
+            for loan in loans
+        ]
+        loan_ids = insert_many(
+            cursor,
+            "loans",
+            ("book_id", "user_id", "loan_date", "return_date", "renewals", "status", "librarian_id"),
+            rows,
+        )
+        record_loans(cursor, loans)
 
         conn.commit()
-        return created_loans
+        bump_table_versions(conn, ("loans",))
+        invalidate_tags("loans")
+        leaderboards.record_loans(loans)
+        return [Loan(id=loan_id, **loan.model_dump()) for loan_id, loan in zip(loan_ids, loans)]
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -269,59 +392,92 @@ def create_loans_bulk(loans: List[LoanCreate]):
         cursor.close()
         conn.close()
 
-@router.get("/loans/", response_model=List[Loan])
-def get_loans():
+@router.get("/loans/", response_model=Page[Loan], response_model_exclude_unset=True)
+@conditional("loans")
+def get_loans(page: PageParams = Depends(), filters: list = Depends(filter_params(Loan))):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT * FROM loans")
-        loans = cursor.fetchall()
-        return [Loan(**loan) for loan in loans]
+        return fetch_page(cursor, "loans", Loan, page, filters)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
         conn.close()
 
-@router.post("/event_registrations/", response_model=List[EventRegistration])
-def create_event_registrations_bulk(event_registrations: List[EventRegistrationCreate]):
+@router.get("/loans/export")
+@conditional("loans")
+def export_loans(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("loans", Loan, format, fields)
+
+@router.post("/event_registrations/", response_model=Union[List[EventRegistration], RegistrationBatch])
+def create_event_registrations_bulk(
+    event_registrations: List[EventRegistrationCreate],
+    mode: RegistrationMode = Query(
+        "all", description="all: register the whole batch or nothing; partial: register what fits, report the rest",
+    ),
+):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    created_registrations = []
+    cursor = conn.cursor(prepared=True)
     
     try:
-        for registration in event_registrations:
-            cursor.execute("SELECT COUNT(*) FROM events WHERE id = %s", (registration.event_id,))
-            event_exists = cursor.fetchone()[0]
-            if not event_exists:
-                raise HTTPException(status_code=404, detail=f"Event with id {registration.event_id} not found")
-
-            cursor.execute("SELECT COUNT(*) FROM users WHERE id = %s", (registration.user_id,))
-            user_exists = cursor.fetchone()[0]
-            if not user_exists:
-                raise HTTPException(status_code=404, detail=f"User with id {registration.user_id} not found")
-
-            cursor.execute(
-                """
-                INSERT INTO event_registrations (event_id, user_id, registration_date)
-                VALUES (%s, %s, %s)
-                """,
-                (registration.event_id, registration.user_id, registration.registration_date)
-            )
-            conn.commit()
-            
-            registration_id = cursor.lastrowid
-            created_registration = EventRegistration(
+        raise_if_missing({
+            "events": find_missing_ids(cursor, "events", [registration.event_id for registration in event_registrations]),
+            "users": find_missing_ids(cursor, "users", [registration.user_id for registration in event_registrations]),
+        })
+
+        requested = Counter(registration.event_id for registration in event_registrations)
+        granted = reserve_seats(cursor, requested, mode)
+        if mode == "all":
+            full = [event_id for event_id, seats in granted.items() if seats < requested[event_id]]
+            if full:
+                raise HTTPException(status_code=409, detail={"message": "Not enough seats left", "events": full})
+
+        # Within an event, seats go to registrations in request order.
+        accepted, rejected = [], []
+        for index, registration in enumerate(event_registrations):
+            if granted[registration.event_id] > 0:
+                granted[registration.event_id] -= 1
+                accepted.append(registration)
+            else:
+                rejected.append(RegistrationRejection(
+                    index=index, event_id=registration.event_id, user_id=registration.user_id, reason="event is full",
+                ))
+
+        rows = [
+            (registration.event_id, registration.user_id, registration.registration_date)
+            for registration in accepted
+        ]
+        registration_ids = insert_many(
+            cursor, "event_registrations", ("event_id", "user_id", "registration_date"), rows
+        )
+        record_registrations(cursor, accepted)
+        conn.commit()
+        bump_table_versions(conn, ("event_registrations", "events"))
+        invalidate_tags("event_registrations", "events")
+
+        registered = [
+            EventRegistration(
                 id=registration_id,
                 event_id=registration.event_id,
                 user_id=registration.user_id,
                 registration_date=registration.registration_date
             )
-            created_registrations.append(created_registration)
-
-        return created_registrations
+            for registration_id, registration in zip(registration_ids, accepted)
+        ]
+        if mode == "partial":
+            return RegistrationBatch(registered=registered, rejected=rejected)
+        return registered
 
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         print(f"Error al crear registros de evento: {e}")
@@ -331,34 +487,42 @@ def create_event_registrations_bulk(event_registrations: List[EventRegistrationC
         cursor.close()
         conn.close()
 
-@router.get("/event_registrations/", response_model=List[EventRegistration])
-def list_event_registrations():
+@router.get("/event_registrations/", response_model=Page[EventRegistration], response_model_exclude_unset=True)
+@conditional("event_registrations")
+def list_event_registrations(page: PageParams = Depends(), filters: list = Depends(filter_params(EventRegistration))):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
 
-    query = "SELECT * FROM event_registrations"
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    try:
+        return fetch_page(cursor, "event_registrations", EventRegistration, page, filters)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
 
-    return rows
+@router.get("/event_registrations/export")
+@conditional("event_registrations")
+def export_event_registrations(
+    format: ExportFormat = Query("ndjson"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to export"),
+):
+    return stream_table("event_registrations", EventRegistration, format, fields)
 
 @router.get("/users/fines_total")
+@conditional("users", "fines")
+@coalesced
+@negotiated
+@cached(tags=("users", "fines"), ttl=30)
 def get_fines_total():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id, u.name, SUM(f.amount) AS total_fines
-        FROM users u
-        LEFT JOIN fines f ON u.id = f.user_id
-        GROUP BY u.id, u.name
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.FINES_TOTAL)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -367,19 +531,17 @@ def get_fines_total():
 
 
 @router.get("/fines/stats")
+@conditional("fines")
+@coalesced
+@negotiated
+@cached(tags=("fines",), ttl=30)
 def get_fine_stats():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT user_id, MAX(amount) AS max_fine, MIN(amount) AS min_fine, AVG(amount) AS avg_fine
-        FROM fines
-        GROUP BY user_id
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.FINE_STATS)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -388,20 +550,16 @@ def get_fine_stats():
 
 
 @router.get("/loans/active")
+@conditional("users", "loans")
+@coalesced
+@negotiated
 def get_active_loans():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id AS user_id, u.name, l.id AS loan_id, l.loan_date, l.return_date
-        FROM users u
-        INNER JOIN loans l ON u.id = l.user_id
-        WHERE l.status = 'active'
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.ACTIVE_LOANS)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -410,22 +568,17 @@ def get_active_loans():
 
 
 @router.get("/books/most_loaned")
+@conditional("books", "loans")
+@coalesced
+@negotiated
+@cached(tags=("books", "loans"), ttl=60)
 def get_most_loaned_book():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT b.title, COUNT(l.id) AS loan_count
-        FROM books b
-        INNER JOIN loans l ON b.id = l.book_id
-        GROUP BY b.id
-        ORDER BY loan_count DESC
-        LIMIT 1
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        return result
+        cursor.execute(queries.MOST_LOANED_BOOK)
+        return result_set(cursor, one=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -433,22 +586,41 @@ def get_most_loaned_book():
         conn.close()
 
 
+@router.get("/books/top")
+@negotiated
+def get_top_books(
+    n: int = Query(10, ge=1, le=LEADERBOARD_SIZE),
+    window: LeaderboardWindow = Query("all", description="all, 30d or 7d, counted by loan_date"),
+):
+    try:
+        return leaderboards.top("books", window, n)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/users/top_renewals")
+@negotiated
+def get_top_renewals(
+    n: int = Query(10, ge=1, le=LEADERBOARD_SIZE),
+    window: LeaderboardWindow = Query("all", description="all, 30d or 7d, counted by loan_date"),
+):
+    try:
+        return leaderboards.top("renewals", window, n)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/users/multiple_loans")
+@conditional("users", "loans")
+@coalesced
+@negotiated
 def get_users_multiple_loans():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id, u.name, COUNT(l.id) AS loan_count
-        FROM users u
-        LEFT JOIN loans l ON u.id = l.user_id
-        GROUP BY u.id
-        HAVING loan_count > 5
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.USERS_MULTIPLE_LOANS)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -457,20 +629,16 @@ def get_users_multiple_loans():
 
 
 @router.get("/events/registrations_count")
+@conditional("users", "event_registrations")
+@coalesced
+@negotiated
 def get_event_registrations_count():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id, u.name, COUNT(er.id) AS registration_count
-        FROM users u
-        LEFT JOIN event_registrations er ON u.id = er.user_id
-        GROUP BY u.id
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.EVENT_REGISTRATIONS_COUNT)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -479,20 +647,16 @@ def get_event_registrations_count():
 
 
 @router.get("/publishers/latest_books")
+@conditional("publishers", "books")
+@coalesced
+@negotiated
 def get_latest_books_by_publisher():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT p.publisher_name, b.title, MAX(b.publication_year) AS latest_year
-        FROM publishers p
-        INNER JOIN books b ON p.id = b.publisher_id
-        GROUP BY p.id
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.LATEST_BOOKS_BY_PUBLISHER)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -501,19 +665,16 @@ def get_latest_books_by_publisher():
 
 
 @router.get("/events/above_average_capacity")
+@conditional("events")
+@coalesced
+@negotiated
 def get_events_above_avg_capacity():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT event_name, capacity
-        FROM events
-        WHERE capacity > (SELECT AVG(capacity) FROM events)
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.EVENTS_ABOVE_AVG_CAPACITY)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -522,20 +683,17 @@ def get_events_above_avg_capacity():
 
 
 @router.get("/users/loans_count")
+@conditional("users", "loans")
+@coalesced
+@negotiated
+@cached(tags=("users", "loans"), ttl=60)
 def get_loans_per_user():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.name, COUNT(l.id) AS loan_count
-        FROM users u
-        LEFT JOIN loans l ON u.id = l.user_id
-        GROUP BY u.name
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.LOANS_PER_USER)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -544,18 +702,16 @@ def get_loans_per_user():
 
 
 @router.get("/events/min_capacity")
+@conditional("events")
+@coalesced
+@negotiated
 def get_min_capacity_event():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT event_name, MIN(capacity) AS min_capacity
-        FROM events
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        return result
+        cursor.execute(queries.MIN_CAPACITY_EVENT)
+        return result_set(cursor, one=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -563,20 +719,16 @@ def get_min_capacity_event():
         conn.close()
 
 @router.get("/users/no_fines")
+@conditional("users", "fines")
+@coalesced
+@negotiated
 def get_users_without_fines():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id, u.name
-        FROM users u
-        LEFT JOIN fines f ON u.id = f.user_id
-        WHERE f.id IS NULL
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.USERS_WITHOUT_FINES)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -585,19 +737,17 @@ def get_users_without_fines():
 
 
 @router.get("/books/category_count")
+@conditional("books")
+@coalesced
+@negotiated
+@cached(tags=("books",), ttl=300)
 def get_book_count_by_category():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT category, COUNT(id) AS book_count
-        FROM books
-        GROUP BY category
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.BOOK_COUNT_BY_CATEGORY)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -606,20 +756,47 @@ def get_book_count_by_category():
 
 
 @router.get("/loans/by_date")
+@conditional("users", "loans")
+@coalesced
+@negotiated
 def get_loans_by_date(loan_date: date = Query(..., description="Fecha específica para buscar préstamos")):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id, u.name, l.id AS loan_id, l.loan_date
-        FROM users u
-        INNER JOIN loans l ON u.id = l.user_id
-        WHERE l.loan_date = %s
-        """
-        cursor.execute(query, (loan_date,))
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.LOANS_BY_DATE, (loan_date,))
+        return result_set(cursor)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/loans/timeseries")
+@conditional("loans", "books")
+@coalesced
+@negotiated
+@cached(tags=("loans", "books"), ttl=60)
+def get_loan_timeseries(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    granularity: Granularity = Query("day"),
+    split: List[TimeseriesSplit] = Query([], description="Break each period down by status and/or book category"),
+    status: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days > TIMESERIES_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Ranges are limited to {TIMESERIES_MAX_DAYS} days")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(*loan_timeseries_query(date_from, date_to, granularity, split, status, category))
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -628,19 +805,17 @@ def get_loans_by_date(loan_date: date = Query(..., description="Fecha específic
 
 
 @router.get("/events/type_count")
+@conditional("events")
+@coalesced
+@negotiated
+@cached(tags=("events",), ttl=300)
 def get_event_count_by_type():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT event_type, COUNT(id) AS event_count
-        FROM events
-        GROUP BY event_type
-        """
-        cursor.execute(query)
-        result = cursor.fetchall()
-        return result
+        cursor.execute(queries.EVENT_COUNT_BY_TYPE)
+        return result_set(cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -649,24 +824,128 @@ def get_event_count_by_type():
 
 
 @router.get("/loans/most_renewals")
+@conditional("users", "loans")
+@coalesced
+@negotiated
 def get_user_with_most_renewals():
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor(prepared=True)
     
     try:
-        query = """
-        SELECT u.id, u.name, SUM(l.renewals) AS total_renewals
-        FROM users u
-        INNER JOIN loans l ON u.id = l.user_id
-        GROUP BY u.id
-        ORDER BY total_renewals DESC
-        LIMIT 1
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        return result
+        cursor.execute(queries.USER_WITH_MOST_RENEWALS)
+        return result_set(cursor, one=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+async def _validated_items(request, adapter):
+    # Parsed and validated off the event loop: a 200k-row body would otherwise
+    # stall every other request while pydantic works through it.
+    body = await request.body()
+    try:
+        return await run_in_threadpool(adapter.validate_json, body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+
+_job_bodies = {
+    "users": TypeAdapter(List[UserCreate]),
+    "loans": TypeAdapter(List[LoanCreate]),
+}
+
+
+@router.post("/jobs/users", status_code=202, openapi_extra={"requestBody": {
+    "content": {"application/json": {"schema": _job_bodies["users"].json_schema()}}, "required": True,
+}})
+async def submit_users_job(request: Request):
+    users = await _validated_items(request, _job_bodies["users"])
+    return submit_job("users", users).snapshot()
+
+
+@router.post("/jobs/loans", status_code=202, openapi_extra={"requestBody": {
+    "content": {"application/json": {"schema": _job_bodies["loans"].json_schema()}}, "required": True,
+}})
+async def submit_loans_job(request: Request):
+    loans = await _validated_items(request, _job_bodies["loans"])
+    return submit_job("loans", loans).snapshot()
+
+
+_upload_body = {"requestBody": {"required": True, "content": {
+    "text/csv": {"schema": {"type": "string", "format": "binary"}},
+    "application/x-ndjson": {"schema": {"type": "string", "format": "binary"}},
+}}}
+
+
+async def _upload(request, kind, format, method):
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        format = UPLOAD_MEDIA_TYPES.get(content_type)
+        if format is None:
+            raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    if method == "load_data" and not LOCAL_INFILE:
+        raise HTTPException(status_code=400, detail="LOAD DATA LOCAL INFILE is disabled; set DATABASE_LOCAL_INFILE")
+    return await receive_upload(request, kind, format, method)
+
+
+@router.post("/users/upload", openapi_extra=_upload_body)
+async def upload_users(
+    request: Request,
+    format: Optional[UploadFormat] = Query(None, description="Overrides the Content-Type header"),
+    method: UploadMethod = Query("insert", description="load_data uses LOAD DATA LOCAL INFILE"),
+):
+    return await _upload(request, "users", format, method)
+
+
+@router.post("/books/upload", openapi_extra=_upload_body)
+async def upload_books(
+    request: Request,
+    format: Optional[UploadFormat] = Query(None, description="Overrides the Content-Type header"),
+    method: UploadMethod = Query("insert", description="load_data uses LOAD DATA LOCAL INFILE"),
+):
+    return await _upload(request, "books", format, method)
+
+
+@router.get("/jobs")
+def get_jobs():
+    return list_jobs()
+
+
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot()
+
+
+@router.get("/pool/stats")
+def get_pool_stats():
+    return pool_stats()
+
+
+@router.get("/pool/replicas")
+def get_replica_stats():
+    return replica_stats()
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    return cache_stats()
+
+
+@router.get("/coalesce/stats")
+def get_coalesce_stats():
+    return coalesce_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(
+        metrics.render(pool=pool_stats(), cache=cache_stats(), coalescing=coalesce_stats()),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,389 @@
+import functools
+import sys
+from app import queries
+from app.database import _env_flag, get_db_connection
+from app.models import User, Fine, Publisher, Event, Book, Loan, EventRegistration
+from app.pagination import PageParams, page_query
+from app.search import SEARCH_COLUMNS, SearchParams, search_query
+from app.registrations import RESERVE_SEATS_PARTIAL
+from app.summaries import backfill_summaries, loan_timeseries_query
+
+MIGRATE_ON_STARTUP = _env_flag("DATABASE_MIGRATE_ON_STARTUP", "false")
+MIGRATION_LOCK = "library_schema_migrate"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def create_index(table, name, columns, kind=""):
+    # Skips the index when one with the same name or column list already exists,
+    # e.g. the implicit index InnoDB creates for a foreign key.
+    def step(cursor):
+        cursor.execute(
+            """
+            SELECT index_name, column_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s
+            ORDER BY index_name, seq_in_index
+            """,
+            (table,),
+        )
+        existing = {}
+        for index_name, column_name in cursor.fetchall():
+            existing.setdefault(index_name, []).append(column_name)
+        if name in existing or list(columns) in existing.values():
+            return
+        cursor.execute(f"CREATE {kind} INDEX {name} ON {table} ({', '.join(columns)})")
+
+    return step
+
+
+def add_column(table, name, definition):
+    # DDL commits on its own, so a migration that fails after this step is re-run
+    # with the column already there.
+    def step(cursor):
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            """,
+            (table, name),
+        )
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    return step
+
+
+MIGRATIONS = [
+    (1, "initial_schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            address VARCHAR(255) NOT NULL,
+            phone VARCHAR(50) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            registration_date DATE NOT NULL,
+            user_type VARCHAR(50) NOT NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS fines (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            reason VARCHAR(255) NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            amount DECIMAL(10, 2) NOT NULL,
+            CONSTRAINT fk_fines_user FOREIGN KEY (user_id) REFERENCES users (id)
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS publishers (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            publisher_name VARCHAR(255) NOT NULL,
+            country VARCHAR(100) NOT NULL,
+            foundation_year INT NOT NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            event_name VARCHAR(255) NOT NULL,
+            description TEXT NOT NULL,
+            event_date DATE NOT NULL,
+            event_type VARCHAR(100) NOT NULL,
+            capacity INT NOT NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            author VARCHAR(255) NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            publication_year INT NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            publisher_id INT NOT NULL,
+            CONSTRAINT fk_books_publisher FOREIGN KEY (publisher_id) REFERENCES publishers (id)
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS loans (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            book_id INT NOT NULL,
+            user_id INT NOT NULL,
+            loan_date DATE NOT NULL,
+            return_date DATE NOT NULL,
+            renewals INT NOT NULL DEFAULT 0,
+            status VARCHAR(50) NOT NULL,
+            librarian_id INT NOT NULL,
+            CONSTRAINT fk_loans_book FOREIGN KEY (book_id) REFERENCES books (id),
+            CONSTRAINT fk_loans_user FOREIGN KEY (user_id) REFERENCES users (id)
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS event_registrations (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            event_id INT NOT NULL,
+            user_id INT NOT NULL,
+            registration_date DATE NOT NULL,
+            CONSTRAINT fk_event_registrations_event FOREIGN KEY (event_id) REFERENCES events (id),
+            CONSTRAINT fk_event_registrations_user FOREIGN KEY (user_id) REFERENCES users (id)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (2, "summary_tables", [
+        """
+        CREATE TABLE IF NOT EXISTS user_fine_summary (
+            user_id INT NOT NULL PRIMARY KEY,
+            fine_count INT NOT NULL,
+            total_amount DECIMAL(14, 2) NOT NULL,
+            min_amount DECIMAL(12, 2) NOT NULL,
+            max_amount DECIMAL(12, 2) NOT NULL
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_loan_summary (
+            user_id INT NOT NULL PRIMARY KEY,
+            loan_count INT NOT NULL,
+            total_renewals INT NOT NULL,
+            KEY idx_user_loan_summary_loan_count (loan_count),
+            KEY idx_user_loan_summary_total_renewals (total_renewals)
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS book_loan_summary (
+            book_id INT NOT NULL PRIMARY KEY,
+            loan_count INT NOT NULL,
+            total_renewals INT NOT NULL,
+            KEY idx_book_loan_summary_loan_count (loan_count)
+        ) ENGINE=InnoDB
+        """,
+        functools.partial(backfill_summaries, tables=("user_fine_summary", "user_loan_summary", "book_loan_summary")),
+    ]),
+    (3, "route_indexes", [
+        create_index("loans", "idx_loans_user_id", ("user_id",)),
+        create_index("loans", "idx_loans_book_id", ("book_id",)),
+        # Covers /loans/active: filter on status, join on user_id, return the dates.
+        create_index("loans", "idx_loans_status_user", ("status", "user_id", "loan_date", "return_date")),
+        create_index("loans", "idx_loans_loan_date_user", ("loan_date", "user_id")),
+        create_index("fines", "idx_fines_user_id", ("user_id",)),
+        create_index("event_registrations", "idx_event_registrations_user_id", ("user_id",)),
+        create_index("event_registrations", "idx_event_registrations_event_id", ("event_id",)),
+        create_index("books", "idx_books_category", ("category",)),
+        create_index("books", "idx_books_publisher_year", ("publisher_id", "publication_year")),
+        create_index("events", "idx_events_event_type", ("event_type",)),
+        create_index("events", "idx_events_capacity", ("capacity",)),
+    ]),
+    # Building it on a large catalog takes a while; InnoDB keeps the table writable meanwhile.
+    (4, "books_fulltext", [
+        create_index("books", "ft_books_title_author", SEARCH_COLUMNS, kind="FULLTEXT"),
+    ]),
+    # Columns the list filters whitelist that had no index yet (see the models' filters).
+    (5, "filter_indexes", [
+        create_index("users", "idx_users_registration_date", ("registration_date",)),
+        create_index("fines", "idx_fines_start_date", ("start_date",)),
+        create_index("events", "idx_events_event_date", ("event_date",)),
+        create_index("loans", "idx_loans_return_date", ("return_date",)),
+    ]),
+    (6, "loan_daily_rollup", [
+        """
+        CREATE TABLE IF NOT EXISTS loan_daily_rollup (
+            loan_date DATE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            loan_count INT NOT NULL,
+            total_renewals INT NOT NULL,
+            PRIMARY KEY (loan_date, status, category)
+        ) ENGINE=InnoDB
+        """,
+        functools.partial(backfill_summaries, tables=("loan_daily_rollup",)),
+    ]),
+    (7, "registration_counters", [
+        add_column("events", "registered_count", "INT NOT NULL DEFAULT 0"),
+        """
+        CREATE TABLE IF NOT EXISTS user_registration_summary (
+            user_id INT NOT NULL PRIMARY KEY,
+            registration_count INT NOT NULL
+        ) ENGINE=InnoDB
+        """,
+        functools.partial(backfill_summaries, tables=("events.registered_count", "user_registration_summary")),
+    ]),
+    (8, "bulk_idempotency", [
+        """
+        CREATE TABLE IF NOT EXISTS bulk_idempotency (
+            id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            idempotency_key VARCHAR(255) NOT NULL,
+            kind VARCHAR(50) NOT NULL,
+            fingerprint BINARY(16) NOT NULL,
+            row_id INT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_bulk_idempotency_lookup (idempotency_key, kind, fingerprint),
+            KEY idx_bulk_idempotency_created_at (created_at)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (9, "table_versions", [
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+            version BIGINT NOT NULL
+        ) ENGINE=InnoDB
+        """,
+    ]),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """
+    )
+
+
+def applied_versions(cursor):
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Serializes concurrent workers that all try to migrate at startup.
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+
+        try:
+            done = applied_versions(cursor)
+            applied = []
+            for version, name, steps in MIGRATIONS:
+                if version in done:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                conn.commit()
+                applied.append((version, name))
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def migration_status():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        done = applied_versions(cursor)
+        return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+_PAGE = PageParams(after=None, limit=100, fields=None)
+
+
+def _page(table, model):
+    return page_query(table, model, _PAGE)
+
+
+# Every statement the routes send, with sample parameters and the table aliases that
+# may legitimately be read in full because the route returns one row per record.
+ROUTE_QUERIES = {
+    "GET /users/": _page("users", User) + ((),),
+    "GET /fines/": _page("fines", Fine) + ((),),
+    "GET /publishers/": _page("publishers", Publisher) + ((),),
+    "GET /events/": _page("events", Event) + ((),),
+    "GET /books/": _page("books", Book) + ((),),
+    "GET /loans/": _page("loans", Loan) + ((),),
+    "GET /event_registrations/": _page("event_registrations", EventRegistration) + ((),),
+    "GET /loans/?user_id=": page_query("loans", Loan, _PAGE, [("user_id", "eq", 1)]) + ((),),
+    "GET /loans/?return_date__lt=": page_query("loans", Loan, _PAGE, [("return_date", "lt", "2024-01-01")]) + ((),),
+    "GET /fines/?start_date__gte=": page_query("fines", Fine, _PAGE, [("start_date", "gte", "2024-01-01")]) + ((),),
+    "GET /books/?publisher_id=": page_query("books", Book, _PAGE, [("publisher_id", "eq", 1)]) + ((),),
+    "GET /events/?event_date__gte=": page_query("events", Event, _PAGE, [("event_date", "gte", "2024-01-01")]) + ((),),
+    "POST /loans/ (user check)": ("SELECT id FROM users WHERE id IN (%s, %s)", (1, 2), ()),
+    "POST /loans/ (book check)": ("SELECT id FROM books WHERE id IN (%s, %s)", (1, 2), ()),
+    "POST /books/ (publisher check)": ("SELECT id FROM publishers WHERE id IN (%s, %s)", (1, 2), ()),
+    "POST /event_registrations/ (event check)": ("SELECT id FROM events WHERE id IN (%s, %s)", (1, 2), ()),
+    "GET /users/fines_total": (queries.FINES_TOTAL, (), ("u",)),
+    "GET /fines/stats": (queries.FINE_STATS, (), ("user_fine_summary",)),
+    "GET /loans/active": (queries.ACTIVE_LOANS, (), ()),
+    "GET /books/search": search_query(SearchParams(q="river", category=None, year_from=None, year_to=None, after=None, limit=20)) + ((),),
+    "GET /books/most_loaned": (queries.MOST_LOANED_BOOK, (), ()),
+    "GET /users/multiple_loans": (queries.USERS_MULTIPLE_LOANS, (), ()),
+    "GET /events/registrations_count": (queries.EVENT_REGISTRATIONS_COUNT, (), ("u",)),
+    "POST /event_registrations/ (seat reservation)": (RESERVE_SEATS_PARTIAL, (10, 1), ()),
+    "GET /publishers/latest_books": (queries.LATEST_BOOKS_BY_PUBLISHER, (), ("p",)),
+    "GET /events/above_average_capacity": (queries.EVENTS_ABOVE_AVG_CAPACITY, (), ()),
+    "GET /users/loans_count": (queries.LOANS_PER_USER, (), ("u",)),
+    "GET /events/min_capacity": (queries.MIN_CAPACITY_EVENT, (), ("events",)),
+    "GET /users/no_fines": (queries.USERS_WITHOUT_FINES, (), ("u",)),
+    "GET /books/category_count": (queries.BOOK_COUNT_BY_CATEGORY, (), ()),
+    "GET /loans/by_date": (queries.LOANS_BY_DATE, ("2024-01-01",), ()),
+    "GET /loans/timeseries": loan_timeseries_query("2024-01-01", "2024-12-31", "week", ("category",)) + ((),),
+    "GET /events/type_count": (queries.EVENT_COUNT_BY_TYPE, (), ()),
+    "GET /loans/most_renewals": (queries.USER_WITH_MOST_RENEWALS, (), ()),
+}
+
+
+def check_query_plans():
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        failures = []
+        for route, (sql, params, allowed) in ROUTE_QUERIES.items():
+            cursor.execute("EXPLAIN " + sql, params)
+            for row in cursor.fetchall():
+                if row["type"] == "ALL" and row["table"] not in allowed:
+                    failures.append((route, row["table"], row.get("rows")))
+        return failures
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+
+    if command == "migrate":
+        for version, name in migrate():
+            print(f"applied {version:04d}_{name}")
+        print("Schema is up to date")
+    elif command == "status":
+        for version, name, done in migration_status():
+            print(f"{version:04d}_{name}: {'applied' if done else 'pending'}")
+    elif command == "check":
+        # Run against a representatively sized dataset: on near-empty tables the
+        # optimizer prefers full scans regardless of the available indexes.
+        failures = check_query_plans()
+        for route, table, rows in failures:
+            print(f"FULL SCAN {route}: table {table} (~{rows} rows)")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(ROUTE_QUERIES)} route queries use indexes")
+    else:
+        sys.exit("usage: python -m app.schema migrate|status|check")
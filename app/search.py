@@ -0,0 +1,114 @@
+import base64
+import binascii
+import json
+import os
+import re
+from typing import Optional
+from fastapi import Depends, HTTPException, Query
+from app.formats import ResultSet, WireFormat, negotiate, result_set
+from app.models import BookSearchHit
+from app.pagination import MAX_PAGE_SIZE, build_page
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+# Relevance order has no stable key to seek from, so pages are offsets and deep
+# paging is capped; nobody reads result 5000 of a catalog search.
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))
+SEARCH_MAX_TERMS = 8
+
+SEARCH_COLUMNS = ("title", "author")
+BOOK_COLUMNS = ["id"] + [field for field in BookSearchHit.model_fields if field not in ("id", "relevance")]
+MATCH = f"MATCH ({', '.join(SEARCH_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)"
+
+# InnoDB's default stopword list. A required stopword matches nothing, so these
+# are dropped from the query instead of making every search with "the" empty.
+STOPWORDS = frozenset((
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i", "in",
+    "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "who",
+    "will", "with", "und", "www",
+))
+
+
+def boolean_query(text):
+    # Free text to BOOLEAN MODE syntax: every word is required and matched as a
+    # prefix, so "silent riv" finds "The Silent River". User-typed operators are
+    # dropped by only keeping word characters.
+    terms = [term for term in re.findall(r"\w+", text.lower()) if term not in STOPWORDS]
+    return " ".join(f"+{term}*" for term in terms[:SEARCH_MAX_TERMS])
+
+
+def encode_offset(offset):
+    payload = json.dumps({"offset": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_offset(token):
+    if not token:
+        return 0
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded))["offset"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return offset
+
+
+class SearchParams:
+    def __init__(
+        self,
+        q: str = Query(..., min_length=1, max_length=200, description="Words to find in title or author; prefixes match"),
+        category: Optional[str] = Query(None),
+        year_from: Optional[int] = Query(None, description="Earliest publication year"),
+        year_to: Optional[int] = Query(None, description="Latest publication year"),
+        after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+        limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        wire_format: WireFormat = Depends(negotiate),
+    ):
+        self.q = q
+        self.category = category
+        self.year_from = year_from
+        self.year_to = year_to
+        self.after = after
+        self.limit = limit
+        self.fields = None
+        self.wire_format = wire_format
+
+
+def search_query(params):
+    terms = boolean_query(params.q)
+    conditions, args = [MATCH], [terms]
+    if params.category is not None:
+        conditions.append("category = %s")
+        args.append(params.category)
+    if params.year_from is not None:
+        conditions.append("publication_year >= %s")
+        args.append(params.year_from)
+    if params.year_to is not None:
+        conditions.append("publication_year <= %s")
+        args.append(params.year_to)
+    query = (
+        f"SELECT {', '.join(BOOK_COLUMNS)}, {MATCH} AS relevance FROM books WHERE {' AND '.join(conditions)} "
+        "ORDER BY relevance DESC, id LIMIT %s OFFSET %s"
+    )
+    # One extra row tells us whether another page exists.
+    return query, (terms, *args, params.limit + 1, decode_offset(params.after))
+
+
+def search_books(cursor, params):
+    offset = decode_offset(params.after)
+    if offset >= SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail=f"Search results are limited to the first {SEARCH_MAX_RESULTS}")
+
+    if boolean_query(params.q):
+        cursor.execute(*search_query(params))
+        result = result_set(cursor)
+    else:
+        # Nothing searchable left, e.g. only stopwords or punctuation.
+        result = ResultSet(BOOK_COLUMNS + ["relevance"], [])
+
+    def cursor_for(_):
+        following = offset + params.limit
+        return encode_offset(following) if following < SEARCH_MAX_RESULTS else None
+
+    return build_page(BookSearchHit, result, params, cursor_for=cursor_for)
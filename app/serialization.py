@@ -0,0 +1,30 @@
+from decimal import Decimal
+import orjson
+from fastapi.responses import Response
+from app.database import _env_flag
+from app.metrics import timed_serialization
+
+# Rows read back from MySQL already have the column types the models declare, so
+# by default list pages are encoded as-is. With RESPONSE_VALIDATION enabled they
+# are validated once, by FastAPI against the route's response_model.
+VALIDATE_RESPONSES = _env_flag("RESPONSE_VALIDATION", "false")
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    # orjson encodes date/datetime natively; DECIMAL columns and SUM() results
+    # come back as Decimal and are sent as numbers, like jsonable_encoder did.
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        with timed_serialization():
+            return dumps(content)
@@ -0,0 +1,231 @@
+import os
+import sys
+from collections import defaultdict
+from typing import Literal
+from app.database import bump_table_versions, get_db_connection, in_list, rows_per_statement, upsert_many
+
+# About ten years; bounds how much of the rollup a single request reads.
+TIMESERIES_MAX_DAYS = int(os.getenv("TIMESERIES_MAX_DAYS", "3660"))
+
+Granularity = Literal["day", "week", "month"]
+TimeseriesSplit = Literal["status", "category"]
+
+# Each period is labelled with its first day; weeks start on Monday.
+PERIODS = {
+    "day": "loan_date",
+    "week": "DATE_SUB(loan_date, INTERVAL WEEKDAY(loan_date) DAY)",
+    "month": "DATE_SUB(loan_date, INTERVAL DAYOFMONTH(loan_date) - 1 DAY)",
+}
+
+REBUILD_QUERIES = {
+    "user_fine_summary": """
+    INSERT INTO user_fine_summary (user_id, fine_count, total_amount, min_amount, max_amount)
+    SELECT user_id, COUNT(*), SUM(amount), MIN(amount), MAX(amount)
+    FROM fines
+    GROUP BY user_id
+    """,
+    "user_loan_summary": """
+    INSERT INTO user_loan_summary (user_id, loan_count, total_renewals)
+    SELECT user_id, COUNT(*), SUM(renewals)
+    FROM loans
+    GROUP BY user_id
+    """,
+    "book_loan_summary": """
+    INSERT INTO book_loan_summary (book_id, loan_count, total_renewals)
+    SELECT book_id, COUNT(*), SUM(renewals)
+    FROM loans
+    GROUP BY book_id
+    """,
+    "user_registration_summary": """
+    INSERT INTO user_registration_summary (user_id, registration_count)
+    SELECT user_id, COUNT(*)
+    FROM event_registrations
+    GROUP BY user_id
+    """,
+    "loan_daily_rollup": """
+    INSERT INTO loan_daily_rollup (loan_date, status, category, loan_count, total_renewals)
+    SELECT l.loan_date, l.status, b.category, COUNT(*), SUM(l.renewals)
+    FROM loans l
+    INNER JOIN books b ON b.id = l.book_id
+    GROUP BY l.loan_date, l.status, b.category
+    """,
+}
+
+# Counters kept on base tables; recomputed in place rather than deleted and reinserted.
+RECOUNT_QUERIES = {
+    "events.registered_count": """
+    UPDATE events e
+    LEFT JOIN (
+        SELECT event_id, COUNT(*) AS registration_count
+        FROM event_registrations
+        GROUP BY event_id
+    ) r ON r.event_id = e.id
+    SET e.registered_count = COALESCE(r.registration_count, 0)
+    """,
+}
+
+
+# Base tables each summary is derived from; routes reading a summary are tagged
+# with these, so a rebuild moves their versions.
+SUMMARY_SOURCES = {
+    "user_fine_summary": ("fines",),
+    "user_loan_summary": ("loans",),
+    "book_loan_summary": ("loans",),
+    "user_registration_summary": ("event_registrations",),
+    "loan_daily_rollup": ("loans", "books"),
+    "events.registered_count": ("events",),
+}
+
+
+def record_fines(cursor, user_id, amounts):
+    if not amounts:
+        return
+    upsert_many(
+        cursor,
+        "user_fine_summary",
+        ("user_id", "fine_count", "total_amount", "min_amount", "max_amount"),
+        [(user_id, len(amounts), sum(amounts), min(amounts), max(amounts))],
+        """
+        fine_count = fine_count + VALUES(fine_count),
+        total_amount = total_amount + VALUES(total_amount),
+        min_amount = LEAST(min_amount, VALUES(min_amount)),
+        max_amount = GREATEST(max_amount, VALUES(max_amount))
+        """,
+    )
+
+
+def record_fine_rows(cursor, fines):
+    # record_fines for fines that may belong to several users, one upsert per user in id order.
+    per_user = defaultdict(list)
+    for fine in fines:
+        per_user[fine.user_id].append(fine.amount)
+    for user_id, amounts in sorted(per_user.items()):
+        record_fines(cursor, user_id, amounts)
+
+
+def _book_categories(cursor, book_ids):
+    wanted = sorted(set(book_ids))
+    categories = {}
+    chunk_size = rows_per_statement(cursor)
+    for start in range(0, len(wanted), chunk_size):
+        chunk = wanted[start:start + chunk_size]
+        placeholders, params = in_list(cursor, chunk)
+        cursor.execute(f"SELECT id, category FROM books WHERE id IN ({placeholders})", params)
+        categories.update(cursor.fetchall())
+    return categories
+
+
+def record_loans(cursor, loans):
+    if not loans:
+        return
+    categories = _book_categories(cursor, [loan.book_id for loan in loans])
+    per_user = defaultdict(lambda: [0, 0])
+    per_book = defaultdict(lambda: [0, 0])
+    per_day = defaultdict(lambda: [0, 0])
+    for loan in loans:
+        per_user[loan.user_id][0] += 1
+        per_user[loan.user_id][1] += loan.renewals
+        per_book[loan.book_id][0] += 1
+        per_book[loan.book_id][1] += loan.renewals
+        day = per_day[(loan.loan_date, loan.status, categories[loan.book_id])]
+        day[0] += 1
+        day[1] += loan.renewals
+
+    on_duplicate = """
+    loan_count = loan_count + VALUES(loan_count),
+    total_renewals = total_renewals + VALUES(total_renewals)
+    """
+    # Rows are sorted by key so concurrent batches lock summary rows in the same order.
+    upsert_many(
+        cursor,
+        "user_loan_summary",
+        ("user_id", "loan_count", "total_renewals"),
+        [(user_id, count, renewals) for user_id, (count, renewals) in sorted(per_user.items())],
+        on_duplicate,
+    )
+    upsert_many(
+        cursor,
+        "book_loan_summary",
+        ("book_id", "loan_count", "total_renewals"),
+        [(book_id, count, renewals) for book_id, (count, renewals) in sorted(per_book.items())],
+        on_duplicate,
+    )
+    upsert_many(
+        cursor,
+        "loan_daily_rollup",
+        ("loan_date", "status", "category", "loan_count", "total_renewals"),
+        [(*key, count, renewals) for key, (count, renewals) in sorted(per_day.items())],
+        on_duplicate,
+    )
+
+
+def record_registrations(cursor, registrations):
+    per_user = defaultdict(int)
+    for registration in registrations:
+        per_user[registration.user_id] += 1
+    upsert_many(
+        cursor,
+        "user_registration_summary",
+        ("user_id", "registration_count"),
+        sorted(per_user.items()),
+        "registration_count = registration_count + VALUES(registration_count)",
+    )
+
+
+def loan_timeseries_query(date_from, date_to, granularity, split=(), status=None, category=None):
+    # Reads only the rollup: one row per day, status and category in the range.
+    period = PERIODS[granularity]
+    groups = ["period"] + [column for column in ("status", "category") if column in split]
+    conditions, params = ["loan_date BETWEEN %s AND %s"], [date_from, date_to]
+    if status is not None:
+        conditions.append("status = %s")
+        params.append(status)
+    if category is not None:
+        conditions.append("category = %s")
+        params.append(category)
+    columns = [f"{period} AS period", *groups[1:], "SUM(loan_count) AS loan_count", "SUM(total_renewals) AS total_renewals"]
+    query = f"""
+    SELECT {', '.join(columns)}
+    FROM loan_daily_rollup
+    WHERE {' AND '.join(conditions)}
+    GROUP BY {', '.join(groups)}
+    ORDER BY {', '.join(groups)}
+    """
+    return query, tuple(params)
+
+
+def backfill_summaries(cursor, tables=None):
+    for table in tables or [*REBUILD_QUERIES, *RECOUNT_QUERIES]:
+        if table in RECOUNT_QUERIES:
+            cursor.execute(RECOUNT_QUERIES[table])
+            continue
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(REBUILD_QUERIES[table])
+
+
+def rebuild_summaries(tables=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        backfill_summaries(cursor, tables)
+        conn.commit()
+        tables = tables or [*REBUILD_QUERIES, *RECOUNT_QUERIES]
+        bump_table_versions(conn, [source for table in tables for source in SUMMARY_SOURCES[table]])
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    # "rebuild loan_daily_rollup" recomputes only the timeseries rollup.
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python -m app.summaries rebuild [table ...]")
+    unknown = [table for table in sys.argv[2:] if table not in REBUILD_QUERIES and table not in RECOUNT_QUERIES]
+    if unknown:
+        sys.exit(f"unknown summary tables: {', '.join(unknown)}")
+    rebuild_summaries(sys.argv[2:])
+    print("Summary tables rebuilt")
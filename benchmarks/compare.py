@@ -0,0 +1,64 @@
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(base, head, threshold):
+    rows, regressions = [], []
+    routes = dict(base["routes"])
+    if base.get("mixed"):
+        routes["mixed GET"] = base["mixed"]
+    head_routes = dict(head["routes"])
+    if head.get("mixed"):
+        head_routes["mixed GET"] = head["mixed"]
+
+    for route in sorted(set(routes) & set(head_routes)):
+        deltas = {metric: change(routes[route][metric], head_routes[route][metric]) for metric in METRICS}
+        rows.append((route, routes[route], head_routes[route], deltas))
+        p95, rps = deltas["p95_ms"], deltas["throughput_rps"]
+        if (p95 is not None and p95 > threshold) or (rps is not None and rps < -threshold):
+            regressions.append(route)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent change in p95 latency or throughput that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    print(f"base {base.get('commit')}  head {head.get('commit')}")
+    rows, regressions = compare(base, head, args.threshold)
+    print(f"{'route':45} " + " ".join(f"{metric:>24}" for metric in METRICS))
+    for route, before, after, deltas in rows:
+        cells = []
+        for metric in METRICS:
+            delta = deltas[metric]
+            cells.append(f"{before[metric]}->{after[metric]} ({'n/a' if delta is None else f'{delta:+.1f}%'})")
+        print(f"{route:45} " + " ".join(f"{cell:>24}" for cell in cells))
+
+    base_rss, head_rss = base["server"]["peak_rss_mb"], head["server"]["peak_rss_mb"]
+    print(f"peak RSS: {base_rss} MB -> {head_rss} MB")
+
+    if regressions:
+        print(f"{len(regressions)} route(s) regressed by more than {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
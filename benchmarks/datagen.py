@@ -0,0 +1,263 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+from app.cache import invalidate_tags
+from app.database import bump_table_versions, get_db_connection, insert_many
+from app.schema import migrate
+from app.summaries import backfill_summaries
+
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# Fixed so the same seed produces the same rows on every run and every commit.
+REFERENCE_DATE = date(2025, 6, 30)
+
+# The driver posts registrations for events 1..DRIVER_EVENTS, so those get no
+# generated registrations and room for every run; the rest are filled to at most
+# REGISTRATION_FILL of their capacity.
+DRIVER_EVENTS = 10
+DRIVER_EVENT_CAPACITY = 1_000_000
+REGISTRATION_FILL = 0.9
+
+TABLES = ("event_registrations", "loans", "fines", "books", "publishers", "events", "users")
+
+FIRST_NAMES = ("Ana", "Luis", "Maria", "Juan", "Sofia", "Carlos", "Lucia", "Jorge", "Elena", "Diego", "Paula", "Andres")
+LAST_NAMES = ("Garcia", "Lopez", "Martinez", "Rodriguez", "Perez", "Gomez", "Diaz", "Torres", "Ruiz", "Vargas")
+CATEGORIES = ("fiction", "science", "history", "children", "poetry", "technology", "art", "philosophy", "travel")
+EVENT_TYPES = ("workshop", "reading", "talk", "book_club", "exhibition")
+COUNTRIES = ("Colombia", "Mexico", "Spain", "Argentina", "Chile", "Peru", "USA", "France")
+WORDS = ("river", "night", "garden", "silent", "city", "memory", "light", "winter", "ocean", "stone", "dream", "road")
+FINE_REASONS = ("late return", "damaged book", "lost book", "missing pages")
+
+
+def plan(loans):
+    return {
+        "users": max(loans // 10, 100),
+        "publishers": max(loans // 2_000, 10),
+        "books": max(loans // 20, 100),
+        "events": DRIVER_EVENTS + max(loans // 1_000, 10),
+        "loans": loans,
+        "fines": loans // 20,
+        "event_registrations": loans // 10,
+    }
+
+
+def zipf_weights(n, skew):
+    # Cumulative weights for random.choices: a few popular books and heavy readers,
+    # a long tail of everything else.
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def random_date(rng, start, days):
+    return start + timedelta(days=rng.randrange(days))
+
+
+class Generator:
+    def __init__(self, seed, today):
+        self.rng = random.Random(seed)
+        self.today = today
+        self.start = today - timedelta(days=3 * 365)
+
+    def title(self):
+        return " ".join(self.rng.choice(WORDS).capitalize() for _ in range(self.rng.randint(1, 4)))
+
+    def person(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def users(self, count):
+        for i in range(count):
+            name = self.person()
+            yield (
+                name,
+                f"Calle {self.rng.randint(1, 200)} # {self.rng.randint(1, 99)}-{self.rng.randint(1, 99)}",
+                f"+57 3{self.rng.randint(100000000, 999999999)}",
+                f"{name.lower().replace(' ', '.')}{i}@example.com",
+                random_date(self.rng, self.start, 3 * 365),
+                self.rng.choices(("student", "teacher", "staff", "external"), weights=(60, 15, 10, 15))[0],
+            )
+
+    def publishers(self, count):
+        for _ in range(count):
+            yield (f"Editorial {self.title()}", self.rng.choice(COUNTRIES), self.rng.randint(1800, 2020))
+
+    def books(self, count, publisher_ids):
+        for _ in range(count):
+            yield (
+                self.title(),
+                self.person(),
+                self.rng.choice(CATEGORIES),
+                self.rng.randint(1900, self.today.year),
+                self.rng.choices(("available", "loaned", "lost"), weights=(70, 28, 2))[0],
+                self.rng.choice(("physical", "digital")),
+                self.rng.choice(publisher_ids),
+            )
+
+    def events(self, count, reserved=0):
+        # The first `reserved` events are the driver's and get DRIVER_EVENT_CAPACITY seats.
+        for i in range(count):
+            yield (
+                f"{self.rng.choice(EVENT_TYPES).replace('_', ' ').title()}: {self.title()}",
+                " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(20, 80))),
+                random_date(self.rng, self.start, 3 * 365 + 90),
+                self.rng.choice(EVENT_TYPES),
+                DRIVER_EVENT_CAPACITY if i < reserved else self.rng.choice((20, 30, 50, 100, 200)),
+            )
+
+    def loans(self, count, user_ids, user_weights, book_ids, book_weights):
+        chunk = 10_000
+        for offset in range(0, count, chunk):
+            size = min(chunk, count - offset)
+            users = self.rng.choices(user_ids, cum_weights=user_weights, k=size)
+            books = self.rng.choices(book_ids, cum_weights=book_weights, k=size)
+            for user_id, book_id in zip(users, books):
+                loan_date = random_date(self.rng, self.start, 3 * 365)
+                age = (self.today - loan_date).days
+                status = "active" if age < 21 else self.rng.choices(("returned", "overdue"), weights=(95, 5))[0]
+                yield (
+                    book_id,
+                    user_id,
+                    loan_date,
+                    loan_date + timedelta(days=14),
+                    min(int(self.rng.expovariate(1.5)), 5),
+                    status,
+                    self.rng.randint(1, 20),
+                )
+
+    def fines(self, count, user_ids, user_weights):
+        for user_id in self.rng.choices(user_ids, cum_weights=user_weights, k=count):
+            start = random_date(self.rng, self.start, 3 * 365)
+            yield (
+                user_id,
+                self.rng.choice(FINE_REASONS),
+                start,
+                start + timedelta(days=self.rng.randint(7, 60)),
+                round(self.rng.lognormvariate(1.5, 0.8), 2),
+            )
+
+    def event_registrations(self, count, event_ids, user_ids, capacities=None):
+        if capacities is None:
+            picks = [self.rng.choice(event_ids) for _ in range(count)]
+        else:
+            # Sampling seats without replacement keeps every event within its share.
+            seats = [
+                event_id
+                for event_id, capacity in zip(event_ids, capacities)
+                for _ in range(int(capacity * REGISTRATION_FILL))
+            ]
+            picks = self.rng.sample(seats, min(count, len(seats)))
+        for event_id in picks:
+            yield (event_id, self.rng.choice(user_ids), random_date(self.rng, self.start, 3 * 365))
+
+
+def load(conn, cursor, table, columns, rows, chunk_size, keep_ids=True):
+    ids = []
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            chunk_ids = insert_many(cursor, table, columns, chunk, chunk_size)
+            conn.commit()
+            count += len(chunk_ids)
+            if keep_ids:
+                ids.extend(chunk_ids)
+            chunk = []
+    if chunk:
+        chunk_ids = insert_many(cursor, table, columns, chunk, chunk_size)
+        conn.commit()
+        count += len(chunk_ids)
+        if keep_ids:
+            ids.extend(chunk_ids)
+    return ids, count
+
+
+def generate(loans, seed, chunk_size, reset, today=REFERENCE_DATE):
+    migrate()
+    counts = plan(loans)
+    gen = Generator(seed, today)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if reset:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            for table in TABLES:
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        timings = {}
+
+        # Fact tables are streamed without keeping their ids so 10M-loan runs stay flat in memory.
+        def timed(table, columns, rows, keep_ids=True):
+            start = time.perf_counter()
+            ids, count = load(conn, cursor, table, columns, rows, chunk_size, keep_ids)
+            timings[table] = time.perf_counter() - start
+            print(f"{table}: {count} rows in {timings[table]:.1f}s")
+            return ids
+
+        user_ids = timed("users", ("name", "address", "phone", "email", "registration_date", "user_type"),
+                         gen.users(counts["users"]))
+        publisher_ids = timed("publishers", ("publisher_name", "country", "foundation_year"),
+                              gen.publishers(counts["publishers"]))
+        book_ids = timed("books", ("title", "author", "category", "publication_year", "status", "type", "publisher_id"),
+                         gen.books(counts["books"], publisher_ids))
+        events = list(gen.events(counts["events"], reserved=DRIVER_EVENTS))
+        event_ids = timed("events", ("event_name", "description", "event_date", "event_type", "capacity"), events)
+        capacities = [event[4] for event in events[DRIVER_EVENTS:]]
+        counts["event_registrations"] = min(
+            counts["event_registrations"], sum(int(capacity * REGISTRATION_FILL) for capacity in capacities)
+        )
+
+        user_weights = zipf_weights(len(user_ids), 0.8)
+        book_weights = zipf_weights(len(book_ids), 1.1)
+        timed("loans", ("book_id", "user_id", "loan_date", "return_date", "renewals", "status", "librarian_id"),
+              gen.loans(counts["loans"], user_ids, user_weights, book_ids, book_weights), keep_ids=False)
+        timed("fines", ("user_id", "reason", "start_date", "end_date", "amount"),
+              gen.fines(counts["fines"], user_ids, user_weights), keep_ids=False)
+        timed("event_registrations", ("event_id", "user_id", "registration_date"),
+              gen.event_registrations(counts["event_registrations"], event_ids[DRIVER_EVENTS:], user_ids, capacities),
+              keep_ids=False)
+
+        backfill_summaries(cursor)
+        # registered_count is recounted from the rows, so this catches a generator
+        # that lets an event overflow before the driver's 409s would.
+        cursor.execute("SELECT COUNT(*) FROM events WHERE registered_count > capacity")
+        overbooked = cursor.fetchone()[0]
+        if overbooked:
+            raise RuntimeError(f"{overbooked} events have more registrations than seats")
+        conn.commit()
+        # Moves the ETags of a running server; its cached results follow them.
+        bump_table_versions(conn, TABLES)
+        invalidate_tags(*TABLES)
+        return counts, timings
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the library database with seeded synthetic data.")
+    parser.add_argument("--scale", choices=SCALES, default="10k", help="number of loans to generate")
+    parser.add_argument("--loans", type=int, help="exact number of loans, overrides --scale")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=5_000)
+    parser.add_argument("--reset", action="store_true", help="truncate the library tables first")
+    parser.add_argument("--today", type=date.fromisoformat, default=REFERENCE_DATE,
+                        help="date the generated history ends on")
+    args = parser.parse_args()
+
+    counts, _ = generate(args.loans or SCALES[args.scale], args.seed, args.chunk_size, args.reset, args.today)
+    print("generated:", ", ".join(f"{table}={count}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+import httpx
+from fastapi.routing import APIRoute
+from app.routes import router
+from benchmarks.datagen import DRIVER_EVENTS, REFERENCE_DATE, Generator
+
+# Operational endpoints are not part of the measured surface.
+SKIP_PATHS = {"/metrics", "/pool/stats", "/pool/replicas", "/cache/stats", "/coalesce/stats"}
+
+PATH_PARAMS = {"user_id": "1"}
+QUERY_PARAMS = {
+    "/loans/by_date": {"loan_date": (REFERENCE_DATE.replace(day=1)).isoformat()},
+    # Two datagen title words, the second as a prefix.
+    "/books/search": {"q": "silent riv"},
+    # The last year of generated loans in weekly buckets, a dashboard-sized range.
+    "/loans/timeseries": {
+        "from": (REFERENCE_DATE - timedelta(days=364)).isoformat(),
+        "to": REFERENCE_DATE.isoformat(),
+        "granularity": "week",
+    },
+}
+
+
+def _jsonable(row):
+    return [value.isoformat() if isinstance(value, date) else value for value in row]
+
+
+def _payload(columns, rows):
+    return [dict(zip(columns, _jsonable(row))) for row in rows]
+
+
+def body_builders(gen, batch):
+    # Referenced ids stay inside the minimum sizes datagen.plan() guarantees.
+    user_ids = list(range(1, 101))
+    book_ids = list(range(1, 101))
+    publisher_ids = list(range(1, 11))
+    # Events datagen leaves open for these writes.
+    event_ids = list(range(1, DRIVER_EVENTS + 1))
+    weights = list(itertools.accumulate([1.0] * 100))
+    return {
+        "/users/": lambda: _payload(
+            ("name", "address", "phone", "email", "registration_date", "user_type"), gen.users(batch)),
+        "/publishers/": lambda: _payload(
+            ("publisher_name", "country", "foundation_year"), gen.publishers(batch)),
+        "/events/": lambda: _payload(
+            ("event_name", "description", "event_date", "event_type", "capacity"), gen.events(batch)),
+        "/books/": lambda: _payload(
+            ("title", "author", "category", "publication_year", "status", "type", "publisher_id"),
+            gen.books(batch, publisher_ids)),
+        "/loans/": lambda: _payload(
+            ("book_id", "user_id", "loan_date", "return_date", "renewals", "status", "librarian_id"),
+            gen.loans(batch, user_ids, weights, book_ids, weights)),
+        "/users/{user_id}/fines/": lambda: _payload(
+            ("user_id", "reason", "start_date", "end_date", "amount"), gen.fines(batch, [1], [1.0])),
+        "/event_registrations/": lambda: _payload(
+            ("event_id", "user_id", "registration_date"), gen.event_registrations(batch, event_ids, user_ids)),
+    }
+
+
+def discover_targets(gen, batch, include_writes):
+    bodies = body_builders(gen, batch)
+    targets, skipped = [], []
+    for route in router.routes:
+        if not isinstance(route, APIRoute) or route.path in SKIP_PATHS:
+            continue
+        for method in sorted(route.methods):
+            name = f"{method} {route.path}"
+            try:
+                url = route.path.format(**PATH_PARAMS)
+            except KeyError:
+                skipped.append(name)
+                continue
+            if method == "GET":
+                targets.append((name, method, url, QUERY_PARAMS.get(route.path), None))
+            elif include_writes and route.path in bodies:
+                targets.append((name, method, url, None, bodies[route.path]))
+            else:
+                skipped.append(name)
+    return targets, skipped
+
+
+def summarize(latencies, wall, errors):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(int(p / 100 * len(latencies)), len(latencies) - 1)] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+    }
+
+
+async def run_phase(client, targets, requests, concurrency):
+    counter = itertools.count()
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            _, method, url, params, body = targets[i % len(targets)]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, params=params, json=body() if body else None)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def read_peak_rss_mb(pid):
+    # VmHWM is the kernel's high-water mark for resident memory (Linux only).
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def start_server(port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/pool/stats", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, base_url):
+    gen = Generator(args.seed, REFERENCE_DATE)
+    targets, skipped = discover_targets(gen, args.write_batch, not args.read_only)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for target in targets:
+            results[target[0]] = await run_phase(client, [target], args.requests, args.concurrency)
+            print(f"{target[0]:45} {results[target[0]]}")
+        reads = [target for target in targets if target[1] == "GET"]
+        mixed = await run_phase(client, reads, args.requests * len(reads), args.concurrency) if reads else None
+        print(f"{'mixed GET':45} {mixed}")
+    return results, mixed, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive every route concurrently and record latency percentiles.")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting uvicorn")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, for peak RSS")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--write-batch", type=int, default=10, help="rows per bulk POST")
+    parser.add_argument("--read-only", action="store_true", help="skip the create_*_bulk routes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--label", help="free-form tag stored in the results file")
+    args = parser.parse_args()
+
+    server = None
+    pid = args.server_pid
+    base_url = args.url
+    if base_url is None:
+        server = start_server(args.port)
+        pid = server.pid
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        results, mixed, skipped = asyncio.run(run(args, base_url))
+        peak_rss = read_peak_rss_mb(pid) if pid else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "label": args.label,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "write_batch": args.write_batch,
+            "read_only": args.read_only,
+            "seed": args.seed,
+        },
+        "server": {"peak_rss_mb": peak_rss},
+        "routes": results,
+        "mixed": mixed,
+        "skipped": skipped,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"{(commit or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"peak RSS: {peak_rss} MB; results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import time
+from decimal import Decimal
+import msgpack
+import orjson
+from pydantic import TypeAdapter
+from app.formats import ResultSet, render
+from app.models import Book, Event, EventRegistration, Fine, Loan, Page, Publisher, User
+from app.serialization import dumps
+from benchmarks.datagen import REFERENCE_DATE, Generator
+
+
+def model_rows(gen, count):
+    # Shaped like dictionary-cursor rows: dates as date, DECIMAL columns as Decimal.
+    ids = list(range(1, 101))
+    weights = [float(i) for i in range(1, 101)]
+    sources = {
+        User: (("name", "address", "phone", "email", "registration_date", "user_type"), gen.users(count)),
+        Fine: (("user_id", "reason", "start_date", "end_date", "amount"),
+               ((*row[:4], Decimal(str(row[4]))) for row in gen.fines(count, ids, weights))),
+        Publisher: (("publisher_name", "country", "foundation_year"), gen.publishers(count)),
+        Event: (("event_name", "description", "event_date", "event_type", "capacity"), gen.events(count)),
+        Book: (("title", "author", "category", "publication_year", "status", "type", "publisher_id"),
+               gen.books(count, ids)),
+        Loan: (("book_id", "user_id", "loan_date", "return_date", "renewals", "status", "librarian_id"),
+               gen.loans(count, ids, weights, ids, weights)),
+        EventRegistration: (("event_id", "user_id", "registration_date"), gen.event_registrations(count, ids, ids)),
+    }
+    for model, (columns, rows) in sources.items():
+        yield model, [{"id": i, **dict(zip(columns, row))} for i, row in enumerate(rows, start=1)]
+
+
+def legacy(model, adapter, rows):
+    # What the list routes did before: a model per row, FastAPI validating the page
+    # again against response_model, then the stdlib encoder in JSONResponse.
+    page = {"items": [model(**row) for row in rows], "next_cursor": None}
+    content = adapter.dump_python(adapter.validate_python(page), mode="json", exclude_unset=True)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def validated(model, adapter, rows):
+    # RESPONSE_VALIDATION=1: plain dicts validated once, dumped by pydantic-core.
+    return adapter.dump_json(adapter.validate_python({"items": rows, "next_cursor": None}), exclude_unset=True)
+
+
+def trusted(model, adapter, rows):
+    # Default: DB rows straight to orjson.
+    return dumps({"items": rows, "next_cursor": None})
+
+
+PATHS = (("legacy", legacy), ("validated", validated), ("trusted", trusted))
+
+# Wire formats negotiated by app.formats, with the matching client-side decoder.
+WIRE_FORMATS = (("json", orjson.loads), ("columnar", orjson.loads), ("msgpack", msgpack.unpackb))
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time list-page serialization and compare wire formats per model.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    gen = Generator(args.seed, REFERENCE_DATE)
+    tables = {}
+    print(f"{'model':20} " + " ".join(f"{name + ' ms':>14}" for name, _ in PATHS) + f" {'speedup':>10}")
+    for model, rows in model_rows(gen, args.rows):
+        adapter = TypeAdapter(Page[model])
+        # All paths must produce the same document for the comparison to be fair.
+        outputs = {json.loads(fn(model, adapter, rows)) == json.loads(legacy(model, adapter, rows)) for _, fn in PATHS}
+        if outputs != {True}:
+            raise SystemExit(f"{model.__name__}: serialization paths disagree")
+        timings = [best_of(lambda: fn(model, adapter, rows), args.repeat) for _, fn in PATHS]
+        print(f"{model.__name__:20} " + " ".join(f"{seconds * 1000:14.1f}" for seconds in timings)
+              + f" {timings[0] / timings[-1]:9.1f}x")
+        tables[model] = rows
+
+    print()
+    print(f"{'model':20} " + " ".join(f"{name + ' KB/decode ms':>26}" for name, _ in WIRE_FORMATS))
+    for model, rows in tables.items():
+        columns = list(rows[0])
+        result = ResultSet(columns, [tuple(row.values()) for row in rows])
+        cells = []
+        for name, decode in WIRE_FORMATS:
+            body = render(result, name, next_cursor=None).body
+            cells.append(f"{len(body) / 1024:.0f} / {best_of(lambda: decode(body), args.repeat) * 1000:.1f}")
+        print(f"{model.__name__:20} " + " ".join(f"{cell:>26}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
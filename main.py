@@ -1,7 +1,55 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from app.compression import CompressionMiddleware
+from app.metrics import MetricsMiddleware
+from app.database import ASYNC_ENABLED, PoolExhaustedError, open_pool, close_pool, route_reads_to_replica
+from app.jobs import shutdown_jobs
+from app.leaderboards import start_leaderboards, stop_leaderboards
 from app.routes import router
+from app.schema import MIGRATE_ON_STARTUP, migrate
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(open_pool)
+    if MIGRATE_ON_STARTUP:
+        await run_in_threadpool(migrate)
+    if ASYNC_ENABLED:
+        from app.async_database import open_async_pool
+        await open_async_pool()
+    start_leaderboards()
+    yield
+    await run_in_threadpool(stop_leaderboards)
+    if ASYNC_ENABLED:
+        from app.async_database import close_async_pool
+        await close_async_pool()
+    await run_in_threadpool(shutdown_jobs)
+    await run_in_threadpool(close_pool)
 
-app.include_router(router)
+
+app = FastAPI(lifespan=lifespan)
+# Metrics is added last so it is outermost and its timings include compression.
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PoolExhaustedError)
+async def pool_exhausted_handler(request: Request, exc: PoolExhaustedError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+async def database_routing(request: Request):
+    # Async so it runs in the request's own context; sync routes inherit the
+    # choice when they are handed to the threadpool.
+    route_reads_to_replica(request.method, getattr(request.scope.get("route"), "path", None))
+
+
+# With DATABASE_ASYNC enabled the async read routes are registered first, so they
+# take precedence over the sync versions of the same paths; writes stay sync.
+if ASYNC_ENABLED:
+    from app.async_routes import async_router
+    app.include_router(async_router, dependencies=[Depends(database_routing)])
+
+app.include_router(router, dependencies=[Depends(database_routing)])
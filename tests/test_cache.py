@@ -0,0 +1,143 @@
+import time
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+from app import cache
+from app.cache import _MISS, MemoryCache, VersionCache, _pack, _unpack, cached, invalidate_tags
+from app.formats import ResultSet
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    fresh = MemoryCache(max_entries=3)
+    monkeypatch.setattr(cache, "backend", fresh)
+    monkeypatch.setattr(cache, "known_versions", VersionCache(ttl=60))
+    return fresh
+
+
+def test_entries_expire(backend):
+    backend.set("a", 1, ttl=0.01)
+    assert backend.get("a") == 1
+    time.sleep(0.02)
+    assert backend.get("a") is _MISS
+
+
+def test_least_recently_used_entry_is_evicted(backend):
+    for key in "abc":
+        backend.set(key, key, ttl=60)
+    backend.get("a")
+    backend.set("d", "d", ttl=60)
+    assert backend.get("b") is _MISS
+    assert backend.get("a") == "a"
+
+
+def test_invalidation_drops_only_tagged_entries(backend):
+    backend.set("loans", 1, ttl=60, tags=("loans",))
+    backend.set("both", 2, ttl=60, tags=("loans", "books"))
+    backend.set("books", 3, ttl=60, tags=("books",))
+    backend.invalidate_tags("loans")
+    assert backend.get("loans") is _MISS
+    assert backend.get("both") is _MISS
+    assert backend.get("books") == 3
+
+
+def test_cached_result_is_reused_until_a_write(backend):
+    calls = []
+
+    @cached(tags=("loans",), ttl=60)
+    def loans_per_user(user_id):
+        calls.append(user_id)
+        return len(calls)
+
+    assert loans_per_user(user_id=1) == 1
+    assert loans_per_user(user_id=1) == 1
+    assert loans_per_user(user_id=2) == 2
+    invalidate_tags("loans")
+    assert loans_per_user(user_id=1) == 3
+
+
+def test_result_read_before_a_write_is_not_served_after_it(backend):
+    @cached(tags=("loans",), ttl=60)
+    def slow_count():
+        # The write commits while this query is still running.
+        invalidate_tags("loans")
+        return "stale"
+
+    assert slow_count() == "stale"
+
+    # Same name, so the same cache key.
+    @cached(tags=("loans",), ttl=60)
+    def slow_count():
+        return "fresh"
+
+    assert slow_count() == "fresh"
+
+
+def test_request_versions_stamp_entries(backend):
+    @cached(tags=("loans",), ttl=60)
+    def count():
+        return object()
+
+    token = cache.use_versions({"loans": 4})
+    try:
+        first = count()
+        assert count() is first
+    finally:
+        cache.reset_versions(token)
+    token = cache.use_versions({"loans": 5})
+    try:
+        assert count() is not first
+    finally:
+        cache.reset_versions(token)
+
+
+def test_replica_reads_are_not_stored(backend, monkeypatch):
+    monkeypatch.setattr(cache, "reading_from_replica", lambda: True)
+
+    @cached(tags=("loans",), ttl=60)
+    def count():
+        return object()
+
+    assert count() is not count()
+    assert backend.size() == 0
+
+
+def test_version_cache_serves_until_forgotten():
+    versions = VersionCache(ttl=60)
+    assert versions.get(["loans"])[0] is None
+    _, generation = versions.get(["loans"])
+    versions.put(["loans"], [3], generation)
+    assert versions.get(["loans"]) == ([3], None)
+    versions.forget(["loans"])
+    assert versions.get(["loans"])[0] is None
+
+
+def test_versions_read_across_a_local_write_are_not_kept():
+    versions = VersionCache(ttl=60)
+    _, generation = versions.get(["loans"])
+    versions.forget(["loans"])
+    versions.put(["loans"], [3], generation)
+    assert versions.get(["loans"])[0] is None
+
+
+def test_versions_expire():
+    versions = VersionCache(ttl=0.01)
+    versions.put(["loans"], [3], versions.get(["loans"])[1])
+    time.sleep(0.02)
+    assert versions.get(["loans"])[0] is None
+
+
+def test_redis_payloads_round_trip_without_pickle():
+    result = ResultSet(
+        ["day", "at", "amount", "count"],
+        [(date(2024, 1, 2), datetime(2024, 1, 2, 3, 4, 5, 6), Decimal("10.50"), 3)],
+    )
+    stamp, value = _unpack(_pack((("db", (1, 2)), result)))
+    assert stamp == ("db", (1, 2))
+    assert value.columns == result.columns
+    assert value.rows == result.rows
+
+
+def test_unsupported_values_are_not_cached_in_redis():
+    with pytest.raises(TypeError):
+        _pack(object())
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import pytest
+from fastapi.responses import Response
+from app.coalesce import coalesced
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @coalesced
+    def report(year):
+        calls.append(year)
+        started.set()
+        release.wait(2)
+        return Response(b"body", headers={"X-Year": str(year)})
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(report(year=2024)))
+    leader.start()
+    started.wait(2)
+    followers = [threading.Thread(target=lambda: results.append(report(year=2024))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(2)
+
+    assert calls == [2024]
+    assert [response.body for response in results] == [b"body"] * 4
+    # Each request can set its own headers without touching the others.
+    assert len({id(response) for response in results}) == 4
+
+
+def test_different_arguments_run_separately():
+    calls = []
+
+    @coalesced
+    def report(year):
+        calls.append(year)
+        return year
+
+    assert [report(year=2023), report(year=2024)] == [2023, 2024]
+    assert calls == [2023, 2024]
+
+
+def test_followers_get_the_leaders_error():
+    started, release = threading.Event(), threading.Event()
+
+    @coalesced
+    def broken():
+        started.set()
+        release.wait(2)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            broken()
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(2)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert errors == ["boom", "boom"]
+
+
+def test_async_calls_share_one_execution():
+    calls = []
+
+    @coalesced
+    async def report(year):
+        calls.append(year)
+        await asyncio.sleep(0.01)
+        return year
+
+    async def main():
+        return await asyncio.gather(*(report(year=2024) for _ in range(5)))
+
+    assert asyncio.run(main()) == [2024] * 5
+    assert calls == [2024]
+
+
+def test_nothing_is_kept_after_the_flight_lands():
+    calls = []
+
+    @coalesced
+    def report():
+        calls.append(1)
+        return len(calls)
+
+    assert report() == 1
+    assert report() == 2
@@ -0,0 +1,131 @@
+import pytest
+from mysql.connector.connection import MySQLConnection
+from mysql.connector.errors import ProgrammingError
+from app.database import (
+    MAX_PREPARED_PARAMS,
+    PreparedCursor,
+    StatementCache,
+    StatementStats,
+    in_list,
+    insert_many,
+    rows_per_statement,
+)
+
+
+class ProtocolConnection(MySQLConnection):
+    # Records the prepared-statement commands a cursor sends instead of talking to a server.
+    def __init__(self):
+        super().__init__()
+        self.commands = []
+        self.next_id = 0
+
+    @property
+    def charset(self):
+        return "utf8mb4"
+
+    def is_connected(self):
+        return True
+
+    def cmd_stmt_prepare(self, statement, **kwargs):
+        self.next_id += 1
+        self.commands.append(("prepare", self.next_id))
+        return {"statement_id": self.next_id, "parameters": [None] * statement.count(b"?"), "columns": []}
+
+    def cmd_stmt_reset(self, statement_id, **kwargs):
+        self.commands.append(("reset", statement_id))
+
+    def cmd_stmt_close(self, statement_id, **kwargs):
+        self.commands.append(("close", statement_id))
+
+    def cmd_stmt_execute(self, statement_id, data=(), parameters=(), **kwargs):
+        self.commands.append(("execute", statement_id, tuple(data)))
+        return {"insert_id": 10, "affected_rows": 1, "warning_count": 0, "status_flag": 0}
+
+
+class FakeCursor:
+    prepared = False
+
+    def __init__(self):
+        self.statements = []
+        self.lastrowid = 1
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+
+class FakePreparedCursor(FakeCursor):
+    prepared = True
+
+    def execute(self, query, params=None, prepare=True):
+        self.statements.append((query, params, prepare))
+
+
+def prepared_cursor(size=4):
+    raw = ProtocolConnection()
+    stats = StatementStats()
+    return PreparedCursor(StatementCache(raw, stats, size)), raw, stats
+
+
+def test_cached_statement_is_prepared_once_and_executed_without_reset():
+    cursor, raw, stats = prepared_cursor()
+    for value in range(3):
+        cursor.execute("UPDATE books SET status = %s WHERE id = %s", (value, 1))
+    assert raw.commands == [
+        ("prepare", 1),
+        ("reset", 1),
+        ("execute", 1, (0, 1)),
+        ("execute", 1, (1, 1)),
+        ("execute", 1, (2, 1)),
+    ]
+    assert (stats.hits, stats.misses, stats.prepared) == (2, 1, 1)
+    assert cursor.lastrowid == 10
+
+
+def test_wrong_parameter_count_is_rejected_before_sending():
+    cursor, raw, _ = prepared_cursor()
+    cursor.execute("SELECT * FROM users WHERE id = %s", (1,))
+    sent = len(raw.commands)
+    with pytest.raises(ProgrammingError):
+        cursor.execute("SELECT * FROM users WHERE id = %s", (1, 2))
+    assert len(raw.commands) == sent
+
+
+def test_least_recently_used_statement_is_closed_when_full():
+    cursor, raw, stats = prepared_cursor(size=2)
+    cursor.execute("SELECT 1 FROM users WHERE id = %s", (1,))
+    cursor.execute("SELECT 1 FROM books WHERE id = %s", (1,))
+    cursor.execute("SELECT 1 FROM users WHERE id = %s", (2,))
+    cursor.execute("SELECT 1 FROM loans WHERE id = %s", (1,))
+    assert ("close", 2) in raw.commands
+    assert (stats.evictions, stats.prepared) == (1, 2)
+
+
+def test_insert_many_prepares_full_chunks_and_sends_the_tail_as_text():
+    cursor = FakePreparedCursor()
+    rows = [(index, "x") for index in range(2500)]
+    insert_many(cursor, "books", ("id", "title"), rows, chunk_size=1000)
+    assert [len(params) // 2 for _, params, _ in cursor.statements] == [1000, 1000, 500]
+    assert [prepare for _, _, prepare in cursor.statements] == [True, True, False]
+    assert cursor.statements[0][0] == cursor.statements[1][0]
+
+
+def test_insert_many_returns_consecutive_ids_per_statement():
+    cursor = FakeCursor()
+    ids = insert_many(cursor, "books", ("title",), [("a",), ("b",), ("c",)], chunk_size=2)
+    assert ids == [1, 2, 1]
+    assert len(cursor.statements) == 2
+
+
+def test_prepared_chunks_stay_under_the_parameter_limit():
+    assert rows_per_statement(FakePreparedCursor(), 7, 100_000) == MAX_PREPARED_PARAMS // 7
+    assert rows_per_statement(FakeCursor(), 7, 100_000) == 100_000
+    assert rows_per_statement(FakePreparedCursor(), 1, 500) == 500
+
+
+def test_in_list_pads_prepared_lists_to_a_power_of_two():
+    placeholders, params = in_list(FakePreparedCursor(), [3, 1, 2])
+    assert placeholders == "%s, %s, %s, %s"
+    assert params == [3, 1, 2, 2]
+    assert len(in_list(FakePreparedCursor(), range(40_000))[1]) == MAX_PREPARED_PARAMS
+    assert in_list(FakeCursor(), [3, 1, 2]) == ("%s, %s, %s", [3, 1, 2])
+    assert in_list(FakePreparedCursor(), []) == ("", [])
@@ -0,0 +1,45 @@
+from typing import List
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from app.filters import MAX_IN_VALUES, filter_params, where_clause
+from app.models import Loan
+
+app = FastAPI()
+
+
+@app.get("/loans")
+def list_loans(filters: List = Depends(filter_params(Loan))):
+    return [[column, operator, str(value)] for column, operator, value in filters]
+
+
+client = TestClient(app)
+
+
+def test_query_parameters_become_typed_filters():
+    response = client.get("/loans", params={"user_id": "3", "loan_date__gte": "2024-01-01"})
+    assert response.status_code == 200
+    assert response.json() == [["user_id", "eq", "3"], ["loan_date", "gte", "2024-01-01"]]
+
+
+def test_in_filters_take_repeated_parameters():
+    response = client.get("/loans?status__in=active&status__in=overdue")
+    assert response.json() == [["status", "in", "['active', 'overdue']"]]
+
+
+def test_values_are_validated_against_the_field_type():
+    assert client.get("/loans", params={"loan_date__lt": "yesterday"}).status_code == 422
+
+
+def test_unlisted_fields_are_ignored():
+    assert client.get("/loans", params={"renewals": "2"}).json() == []
+
+
+def test_in_lists_are_capped():
+    response = client.get("/loans", params=[("user_id__in", str(index)) for index in range(MAX_IN_VALUES + 1)])
+    assert response.status_code == 400
+
+
+def test_where_clause_keeps_values_as_parameters():
+    conditions, params = where_clause([("user_id", "in", [1, 2]), ("loan_date", "lt", "2024-01-01")])
+    assert conditions == ["user_id IN (%s, %s)", "loan_date < %s"]
+    assert params == [1, 2, "2024-01-01"]
@@ -0,0 +1,56 @@
+from datetime import date
+from typing import Optional
+from pydantic import BaseModel
+from app.ingest import UploadReport, _csv_records, _lines, _ndjson_records, _nullable_fields
+
+
+class Return(BaseModel):
+    return_date: Optional[date] = None
+    status: str
+
+
+def test_lines_are_split_across_chunk_boundaries():
+    chunks = [b"\xef\xbb\xbfa,b\n1,", b"2\n3,4", b"\n5,6"]
+    assert list(_lines(chunks)) == ["a,b\n", "1,2\n", "3,4\n", "5,6"]
+
+
+def test_multibyte_characters_split_across_chunks_are_decoded():
+    text = "name\nJosé\n".encode()
+    split = text.index(b"\xa9")
+    assert list(_lines([text[:split], text[split:]])) == ["name\n", "José\n"]
+
+
+def test_ndjson_errors_carry_their_line_numbers():
+    lines = ['{"a": 1}\n', "\n", "{oops\n", "[1, 2]\n", '{"a": 2}\n']
+    records = list(_ndjson_records(lines))
+    assert [(line, record) for line, record, _ in records] == [
+        (1, {"a": 1}), (3, None), (4, None), (5, {"a": 2}),
+    ]
+    assert records[1][2].startswith("invalid JSON")
+    assert records[2][2] == "expected a JSON object"
+
+
+def test_csv_line_numbers_follow_quoted_newlines():
+    lines = ["name,address\n", 'Ana,"Calle 1,\n', ' apt 2"\n', "Luis,a,extra\n", "Zoe,b\n"]
+    records = list(_csv_records(lines))
+    assert records[0] == (3, {"name": "Ana", "address": "Calle 1,\n apt 2"}, None)
+    assert records[1] == (4, None, "more values than header columns")
+    assert records[2] == (5, {"name": "Zoe", "address": "b"}, None)
+
+
+def test_empty_csv_cells_are_null_only_where_the_model_allows_it():
+    nullable = _nullable_fields(Return)
+    assert nullable == {"return_date"}
+    (_, record, _), = _csv_records(["return_date,status\n", ",\n"], nullable)
+    assert record == {"return_date": None, "status": ""}
+
+
+def test_report_keeps_a_bounded_error_list(monkeypatch):
+    monkeypatch.setattr("app.ingest.UPLOAD_MAX_ERRORS", 2)
+    report = UploadReport()
+    report.fail([(1, "a"), (2, "b")])
+    report.fail([(3, "c")])
+    summary = report.as_dict()
+    assert summary["rows_failed"] == 3
+    assert summary["errors"] == [{"line": 1, "error": "a"}, {"line": 2, "error": "b"}]
+    assert summary["errors_truncated"]
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from app import leaderboards
+from app.leaderboards import Leaderboard
+
+TODAY = date(2025, 6, 30)
+
+
+class SnapshotCursor:
+    # Answers every window's query with the same rows.
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params):
+        pass
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+def loan(book_id, days_ago=0):
+    return SimpleNamespace(book_id=book_id, user_id=1, renewals=0, loan_date=TODAY - timedelta(days=days_ago))
+
+
+def board(rows):
+    leaderboard = Leaderboard(
+        ("book_id", "title", "loan_count"), "all", "since", key=lambda loan: loan.book_id, weight=lambda loan: 1,
+    )
+    leaderboard.reconcile(SnapshotCursor(rows), TODAY)
+    return leaderboard
+
+
+def test_recorded_loans_are_added_to_the_snapshot():
+    leaderboard = board([(1, "A", 5), (2, "B", 4)])
+    assert not leaderboard.record([loan(2), loan(2)], TODAY)
+    assert list(leaderboard.top("all", 2).rows) == [(2, "B", 6), (1, "A", 5)]
+
+
+def test_old_loans_only_count_in_the_windows_that_cover_them():
+    leaderboard = board([(1, "A", 5)])
+    leaderboard.record([loan(1, days_ago=10)], TODAY)
+    assert list(leaderboard.top("all", 1).rows) == [(1, "A", 6)]
+    assert list(leaderboard.top("30d", 1).rows) == [(1, "A", 6)]
+    assert list(leaderboard.top("7d", 1).rows) == [(1, "A", 5)]
+
+
+def test_new_entry_in_a_short_snapshot_wakes_reconciliation():
+    leaderboard = board([(1, "Known", 5)])
+    assert leaderboard.record([loan(42)] * 7, TODAY)
+    assert list(leaderboard.top("all", 2).rows) == [(42, None, 7), (1, "Known", 5)]
+
+
+def test_outsider_of_a_full_snapshot_wakes_reconciliation_once_it_can_place(monkeypatch):
+    monkeypatch.setattr(leaderboards, "LEADERBOARD_SIZE", 2)
+    monkeypatch.setattr(leaderboards, "LEADERBOARD_DEPTH", 4)
+    # The board's last entry has 8, the snapshot's last 5: a gap of 3.
+    leaderboard = board([(1, "A", 9), (2, "B", 8), (3, "C", 6), (4, "D", 5)])
+    assert not leaderboard.record([loan(99)] * 2, TODAY)
+    assert leaderboard.record([loan(99)], TODAY)
+
+
+def test_top_is_cut_to_n():
+    leaderboard = board([(1, "A", 3), (2, "B", 2), (3, "C", 1)])
+    assert list(leaderboard.top("all", 2).rows) == [(1, "A", 3), (2, "B", 2)]
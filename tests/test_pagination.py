@@ -0,0 +1,63 @@
+import pytest
+from fastapi import HTTPException
+from app.formats import ResultSet
+from app.models import User
+from app.pagination import build_page, decode_cursor, encode_cursor, page_query, select_columns
+
+
+class Page:
+    def __init__(self, after=None, limit=2, fields=None, wire_format="columnar"):
+        self.after = after
+        self.limit = limit
+        self.fields = fields
+        self.wire_format = wire_format
+
+
+def test_cursor_round_trips():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+    assert "=" not in encode_cursor(7)
+
+
+def test_missing_cursor_starts_at_the_beginning():
+    assert decode_cursor(None) == 0
+    assert decode_cursor("") == 0
+
+
+@pytest.mark.parametrize("token", ["not base64!", encode_cursor("12"), "eyJ4IjoxfQ"])
+def test_bad_cursor_is_a_400(token):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(token)
+    assert raised.value.status_code == 400
+
+
+def test_projection_always_includes_the_id():
+    assert select_columns(User, "email, name") == ["id", "name", "email"]
+    assert select_columns(User, None) == list(User.model_fields)
+
+
+def test_unknown_fields_are_a_400():
+    with pytest.raises(HTTPException) as raised:
+        select_columns(User, "name,password")
+    assert raised.value.detail == "Unknown fields: password"
+
+
+def test_page_query_reads_one_row_past_the_limit():
+    page = Page(after=encode_cursor(40), limit=10, fields="name")
+    query, params = page_query("users", User, page, [("registration_date", "gte", "2024-01-01")])
+    assert query == (
+        "SELECT id, name FROM users WHERE id > %s AND registration_date >= %s ORDER BY id LIMIT %s"
+    )
+    assert params == (40, "2024-01-01", 11)
+
+
+def test_next_cursor_points_past_the_last_row_served():
+    result = ResultSet(["id", "name"], [(1, "a"), (2, "b"), (3, "c")])
+    response = build_page(User, result, Page(limit=2))
+    assert b'"rows":[[1,"a"],[2,"b"]]' in response.body
+    assert encode_cursor(2).encode() in response.body
+
+
+def test_last_page_has_no_next_cursor():
+    result = ResultSet(["id", "name"], [(1, "a")])
+    response = build_page(User, result, Page(limit=2))
+    assert b'"next_cursor":null' in response.body
@@ -0,0 +1,157 @@
+import threading
+import time
+import pytest
+from app.database import ConnectionPool, PoolExhaustedError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.in_transaction = False
+        self.closed = False
+        self.pings = 0
+        self.rollbacks = 0
+        self.fail_ping = False
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.fail_ping:
+            raise ConnectionError("gone")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def cursor(self, *args, **kwargs):
+        return None
+
+    def close(self):
+        self.closed = True
+
+
+class Connector:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.opened))
+        self.opened.append(conn)
+        return conn
+
+
+def make_pool(size=2, max_overflow=1, timeout=0.2, recycle=0, pre_ping=False):
+    connect = Connector()
+    return ConnectionPool(connect, size, max_overflow, timeout, recycle, pre_ping), connect
+
+
+def test_release_keeps_the_connection_for_the_next_checkout():
+    pool, connect = make_pool()
+    first = pool.acquire()
+    number = first.number
+    first.close()
+    second = pool.acquire()
+    assert second.number == number
+    assert len(connect.opened) == 1
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_close_twice_releases_once():
+    pool, _ = make_pool()
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+
+
+def test_overflow_connections_are_closed_on_release():
+    pool, connect = make_pool(size=1, max_overflow=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert pool.stats()["opened"] == 2
+    first.close()
+    second.close()
+    stats = pool.stats()
+    assert stats["opened"] == 1
+    assert stats["idle"] == 1
+    assert [conn.closed for conn in connect.opened] == [False, True]
+
+
+def test_exhausted_pool_times_out():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    assert pool.stats()["exhausted"] == 1
+    held.close()
+
+
+def test_waiter_gets_the_released_connection():
+    pool, _ = make_pool(size=1, max_overflow=0, timeout=2)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    held.close()
+    waiter.join(2)
+    assert len(got) == 1
+    assert pool.stats()["wait_seconds_max"] > 0
+    got[0].close()
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool, connect = make_pool()
+    conn = pool.acquire()
+    connect.opened[0].in_transaction = True
+    conn.close()
+    assert connect.opened[0].rollbacks == 1
+
+
+def test_old_connections_are_recycled():
+    pool, connect = make_pool(recycle=0.01)
+    pool.acquire().close()
+    time.sleep(0.02)
+    conn = pool.acquire()
+    assert conn.number == 1
+    assert connect.opened[0].closed
+    conn.close()
+
+
+def test_failed_ping_replaces_the_connection():
+    pool, connect = make_pool(pre_ping=True)
+    pool.acquire().close()
+    connect.opened[0].fail_ping = True
+    conn = pool.acquire()
+    assert conn.number == 1
+    assert connect.opened[0].closed
+    assert pool.stats()["opened"] == 1
+    conn.close()
+
+
+def test_failed_connect_gives_the_slot_back():
+    def connect():
+        raise ConnectionError("refused")
+
+    pool = ConnectionPool(connect, 1, 0, 0.05, 0, False)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats["opened"] == 0
+    assert stats["in_use"] == 0
+
+
+def test_warm_opens_the_core_connections():
+    pool, connect = make_pool(size=3)
+    pool.warm()
+    assert len(connect.opened) == 3
+    assert pool.stats()["idle"] == 3
+
+
+def test_closed_pool_refuses_checkouts_and_closes_idle_connections():
+    pool, connect = make_pool()
+    pool.acquire().close()
+    pool.close()
+    assert connect.opened[0].closed
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()